@@ -49,31 +49,45 @@ class PVRenderActor:
     """A class for rendering data using ParaView as a Dask Actor"""
     framenum = 0
     frametime = 0 #time to render the latest frame
+    readbacktime = 0 #time to read back the latest encoded frame
     rank,size = 0, 1
-    def __init__(self, x):
+    shares = 0 #clients reading frames from shared memory; see shareFrames
+    def __init__(self, x, pvs=None, w2i=None):
         #NOTE: 'x' is required in order to instantiate an actor across all nodes by passing
         #a sequence of variables
-        import paraview
-        paraview.options.batch = True
-        paraview.options.symmetric = True
-        import paraview.simple as pvs
-        self.pvs = pvs
-
-        from mpi4py import MPI
-        self.rank,self.size = MPI.COMM_WORLD.Get_rank(), MPI.COMM_WORLD.Get_size()
+        #pvs and w2i replace paraview.simple and the VTK window to image filter,
+        #e.g. with the stand-ins in benchmarks.mock; the actor then runs alone
+        #without MPI
+        comm = None
+        if pvs is None:
+            import paraview
+            paraview.options.batch = True
+            paraview.options.symmetric = True
+            import paraview.simple as pvs
 
-        import vtk
-        from vtk import vtkWindowToImageFilter
+            from mpi4py import MPI
+            comm = MPI.COMM_WORLD
+            self.rank,self.size = comm.Get_rank(), comm.Get_size()
+        self.pvs = pvs
 
         # Create render view and image transfer filter objects
         self.renv = pvs.CreateRenderView()
-        self.w2i = vtkWindowToImageFilter()
+        if w2i is None:
+            from vtk import vtkWindowToImageFilter
+            w2i = vtkWindowToImageFilter()
+        self.w2i = w2i
         self.w2i.ReadFrontBufferOff()
         self.w2i.ShouldRerenderOff()
         self.w2i.SetInput(self.renv.SMProxy.GetRenderWindow())
 
+        # Readback buffers; a few slots so results still being sent back to
+        # the client aren't overwritten by the next readback
+        from .frames import FrameRing
+        self.frames = FrameRing(slots=4)
+
         # Make sure all ranks have initialized
-        MPI.COMM_WORLD.Barrier()
+        if comm is not None:
+            comm.Barrier()
         if self.rank == 0:
             print("All ranks ready for rendering")
 
@@ -111,6 +125,22 @@ class PVRenderActor:
                  self.renv.CameraViewUp,
                  rlim)
 
+    def setCam(self, position, focalPoint, viewUp):
+        """Moves the camera to the given absolute position"""
+        (self.renv.CameraPosition,
+         self.renv.CameraFocalPoint,
+         self.renv.CameraViewUp) = (list(position), list(focalPoint), list(viewUp))
+
+    def setViewSize(self, w, h):
+        """Resizes the render view, e.g. to render at a lower resolution"""
+        self.renv.ViewSize = [w, h]
+
+    def getCam(self):
+        """Returns the camera's (position, focal point, view up)"""
+        return (list(self.renv.CameraPosition),
+                list(self.renv.CameraFocalPoint),
+                list(self.renv.CameraViewUp))
+
     def render(self):
         """Render a frame and return it as a numpy array"""
         import time
@@ -120,16 +150,108 @@ class PVRenderActor:
             self.frametime = time.time()-ts
             self.framenum += 1
 
-    def fetchFrame(self):
-        # Mathias's magic frame fetching snippet
-        self.w2i.Modified()
-        self.w2i.Update()
-        imagedata = self.w2i.GetOutput()
-        w,h,_ = imagedata.GetDimensions()
-        import numpy as np
-        from vtk.util.numpy_support import vtk_to_numpy
-        imagedata_np = vtk_to_numpy(imagedata.GetPointData().GetScalars()).reshape((h,w,3))
-        return np.flipud(np.pad(imagedata_np, ((0,0),(0,0),(0,1)), mode='constant', constant_values=255))
+    def interact(self, events, wantFrame=True, channels=4, encode=None,
+            depth=None, shared=False, timed=False):
+        """Apply a batch of camera events, render, and return rank 0's frame
+
+        events is a list of (name, args) pairs, where name is 'rotate', 'pan',
+        'zoom', 'camera' or 'viewSize' and args are the arguments to
+        rotateCam, panCam, zoomCam, setCam or setViewSize.
+        The frame is read back as by fetchFrame(channels), but into a buffer
+        that's reused a few frames later, or as by fetchEncodedFrame(**encode)
+        if encode is given. Ranks other than 0
+        return None, as does wantFrame=False. With shared=True, after
+        shareFrames(), a raw frame stays in shared memory and rank 0 returns
+        its sharedframes.SharedFrame instead. With depth, a dict of arguments
+        to fetchDepth, rank 0's frame is (frame, depth, camera) instead, with
+        camera as by frames.cameraState. With timed=True, the result is
+        (result, {stage: seconds}) with the render, readback and encode times
+        on this rank.
+        """
+        import time
+        ops = {'rotate': self.rotateCam, 'pan': self.panCam, 'zoom': self.zoomCam,
+                'camera': self.setCam, 'viewSize': self.setViewSize}
+        for name,args in events:
+            ops[name](*args)
+        self.render()
+        timings = {'actorRender': self.frametime}
+        result = None
+        if wantFrame and self.rank == 0:
+            ts = time.perf_counter()
+            if encode is not None:
+                result = self.fetchEncodedFrame(**encode)
+                #fetchEncodedFrame keeps its readback time apart
+                timings['actorReadback'] = self.readbacktime
+                timings['actorEncode'] = time.perf_counter() - ts - self.readbacktime
+            else:
+                result = self.__readFrame(channels)
+                if shared and hasattr(self.frames, 'publish'):
+                    result = self.frames.publish()
+                timings['actorReadback'] = time.perf_counter() - ts
+            if depth is not None:
+                from .frames import cameraState
+                ts = time.perf_counter()
+                result = (result, self.fetchDepth(**depth), cameraState(self.renv))
+                timings['actorDepth'] = time.perf_counter() - ts
+        return (result, timings) if timed else result
+
+    def fetchFrame(self, channels=4):
+        """Read back the latest frame as RGBA (channels=4) or RGB (channels=3)"""
+        return self.__readFrame(channels).copy()
+
+    def __readFrame(self, channels=4):
+        #reads back into the ring, for results that don't outlive the next
+        #few readbacks
+        from .frames import readFrame
+        self.frames.channels = channels
+        return readFrame(self.w2i, self.frames)
+
+    def fetchEncodedFrame(self, codec='jpeg', quality=50, step=1):
+        """Read back the latest frame, subsampled by step, and encode it here
+
+        Returns the encoded bytes, so that only those travel to the client.
+        codec is any of frames.CODECS on this worker.
+        """
+        import time
+        from .frames import compressFrame
+        ts = time.perf_counter()
+        frame = self.__readFrame()
+        self.readbacktime = time.perf_counter() - ts
+        return compressFrame(frame[::step, ::step], codec, quality)
+
+    def shareFrames(self):
+        """Read frames back into shared memory, for a client on the same host
+
+        Returns the name to open a sharedframes.SharedFrameReader with on
+        rank 0, None on other ranks. The memory is visible only to processes
+        on this host; clients elsewhere keep getting frames over the network.
+        Each call is undone with unshareFrames().
+        """
+        from .sharedframes import SharedFrameRing
+        if self.rank != 0:
+            return None
+        if not isinstance(self.frames, SharedFrameRing):
+            self.frames = SharedFrameRing(slots=4, channels=self.frames.channels)
+        self.shares += 1
+        return self.frames.name
+
+    def unshareFrames(self):
+        """Undoes a shareFrames() call; the shared memory is released once
+        every client that shared the frames has unshared them
+        """
+        from .frames import FrameRing
+        if self.rank != 0 or self.shares == 0:
+            return
+        self.shares -= 1
+        if self.shares == 0:
+            frames, self.frames = self.frames, FrameRing(slots=4,
+                    channels=self.frames.channels)
+            frames.close()
+
+    def fetchDepth(self, step=1):
+        """Read back the latest depth buffer, packed as by frames.packDepth"""
+        from .frames import readDepth, packDepth
+        return packDepth(readDepth(self.w2i), step)
 
     def run(self, fun, args):
         """Run the given function on the Actor's worker node"""
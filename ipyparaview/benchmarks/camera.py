@@ -0,0 +1,114 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Benchmarks camera_models against the original scalar implementation
+#usage: python -m ipyparaview.benchmarks.camera [N]
+import math
+import sys
+import timeit
+import numpy as np
+
+from ..camera_models import *
+
+###############################################################################
+# The original per-event implementation, kept as the reference
+def _normalize(v):
+    return v/np.linalg.norm(v)
+
+def _cartToSphr(p):
+    r = np.linalg.norm(p)
+    return np.array([r, math.atan2(p[0], p[2]), math.asin(p[1]/r)])
+
+def _sphrToCart(p):
+    return np.array([p[0]*math.sin(p[1])*math.cos(p[2]),
+            p[0]*math.sin(p[2]),
+            p[0]*math.cos(p[1])*math.cos(p[2])])
+
+def rotateReference(d, p, f, u, scale, phiLimit):
+    f = np.array(f)
+    p = np.array(p) - f
+    b1 = _normalize(np.array(u))
+    b0 = _normalize(np.cross(b1, p))
+    b2 = np.cross(b0, b1)
+    fromU = np.column_stack([b0,b1,b2])
+    toU = np.linalg.inv(fromU)
+    cp = _cartToSphr( np.matmul(toU,p) )
+    cp[1] -= scale*d['x']
+    cp[2] = max(-phiLimit, min(phiLimit, cp[2]-scale*d['y']))
+    p = np.matmul( fromU, _sphrToCart(cp) )
+    return (p+f, f, u)
+
+def panReference(d, p, f, u, angle):
+    f = np.array(f)
+    p = np.array(p)-f
+    u = np.array(u)
+    h = _normalize(np.cross(p, u))
+    v = _normalize(np.cross(p, h))
+    f += (d['x']*h + d['y']*v)*np.linalg.norm(p)*2*math.tan(math.pi*angle/360)
+    return (p+f, f, u)
+
+def zoomReference(d, p, f, u, rlimit):
+    f = np.array(f)
+    p = np.array(p)-f
+    r = np.linalg.norm(p)
+    p *= max(rlimit, r*d)/r
+    return (p+f, f, u)
+
+###############################################################################
+def _sequential(fun, deltas, cam, *args):
+    #applies deltas one event at a time, like the widget used to
+    p,f,u = cam
+    for d in deltas:
+        p,f,u = fun(d, p, f, u, *args)
+    return p
+
+def run(n=1000, repeat=5):
+    """Times n events per-event and batched; returns {name: seconds}"""
+    rng = np.random.default_rng(0)
+    cam = ([0.0, 0.5, 3.0], [0.1, 0.0, 0.0], [0.0, 1.0, 0.0])
+    dxy = rng.uniform(-0.02, 0.02, size=(n,2))
+    dicts = [{'x': x, 'y': y} for x,y in dxy]
+    zooms = 1.05**rng.integers(-2, 3, size=n)
+
+    cases = {
+        'rotate': ((rotateReference, dicts), (rotateCameraTurntable, dicts),
+            (rotateCameraTurntableBatch, dxy), (5.0, 1.5175)),
+        'pan': ((panReference, dicts), (panCameraTurntable, dicts),
+            (panCameraTurntableBatch, dxy), (30.0,)),
+        'zoom': ((zoomReference, zooms), (zoomCameraTurntable, zooms),
+            (zoomCameraTurntableBatch, zooms), (0.00001,)),
+    }
+
+    results = {}
+    for name,((ref,rd), (single,sd), (batch,bd), args) in cases.items():
+        #the batched path must end where the per-event path does
+        pr = _sequential(ref, rd, cam, *args)
+        pb = batch(bd, *cam, *args, cumulative=True)[0][-1]
+        assert np.allclose(pr, pb), (name, pr, pb)
+
+        timers = {
+            name+'/reference': lambda: _sequential(ref, rd, cam, *args),
+            name+'/per-event': lambda: _sequential(single, sd, cam, *args),
+            name+'/batch': lambda: batch(bd, *cam, *args, cumulative=True),
+        }
+        for k,t in timers.items():
+            results[k] = min(timeit.repeat(t, number=1, repeat=repeat))
+    return results
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for k,t in run(n).items():
+        print('%-20s %10.3f ms  %8.2f us/event' % (k, 1e3*t, 1e6*t/n))
@@ -0,0 +1,173 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Benchmarks PVDisplay's frame path on the mock renderer
+#usage: python -m ipyparaview.benchmarks.display [--json FILE] [--frames N]
+#           [--scene SCENE] [--resolutions WxH,...] [--modes MODE,...] [--dask]
+#
+#Each run is one mode at one resolution, sync or async; the results are a
+#list of dicts with frames/s, bytes per frame and per-stage percentiles (in
+#seconds), written as JSON with --json to compare across commits.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import numpy as np
+
+from .mock import MockParaView, MockWindowToImage, SCENES
+from ..widgets import PVDisplay
+
+#PVDisplay arguments for each mode; pipelined needs the async render loop
+MODES = {
+    'raw': {},
+    'rgb': {'frameFormat': 'rgb'},
+    'delta': {'deltaFrames': True, 'frameFormat': 'rgb'},
+    'jpeg': {'compressFrames': True},
+    'jpeg-pipelined': {'compressFrames': True, 'pipelined': True},
+}
+RESOLUTIONS = [(640,360), (1280,720), (1920,1080)]
+
+def _display(ren, runAsync, mode, **kwargs):
+    return PVDisplay(ren, runAsync=runAsync, fpsLimit=1e9, #as fast as it goes
+            **MODES[mode], **kwargs)
+
+def runOne(mode, resolution, runAsync, frames=100, scene='animated',
+        renderTime=0.0, client=None):
+    """Benchmarks one configuration; returns a dict of results
+
+    With a dask.distributed client, the frames are rendered by a mock
+    PVRenderActor on the cluster instead.
+    """
+    pvs = MockParaView(size=resolution, scene=scene, renderTime=renderTime)
+    if client is not None:
+        from .. import PVRenderActor
+        ren = [client.submit(PVRenderActor, 0, pvs=pvs, w2i=MockWindowToImage(),
+                actor=True).result()]
+    else:
+        ren = pvs.CreateRenderView()
+
+    sizes = []
+    done = threading.Event()
+    def onFrame(stages):
+        if 'frame' in stages:
+            sizes.append(disp.frameBytes)
+            if len(sizes) >= frames:
+                done.set()
+
+    ts = time.perf_counter()
+    if runAsync:
+        disp = _display(ren, True, mode, pvs=pvs, w2i=MockWindowToImage())
+        disp.metrics.addHook(onFrame)
+        done.wait(60.0)
+        disp.setAsync(False)
+    else:
+        disp = _display(ren, False, mode, pvs=pvs, w2i=MockWindowToImage())
+        disp.metrics.addHook(onFrame)
+        ts = time.perf_counter()
+        while not done.is_set():
+            disp.render()
+    elapsed = time.perf_counter() - ts
+    disp.close()
+
+    n = len(sizes)
+    return {
+        'mode': mode,
+        'resolution': list(resolution),
+        'async': runAsync,
+        'dask': client is not None,
+        'scene': scene,
+        'frames': n,
+        'seconds': elapsed,
+        'fps': n/elapsed if elapsed > 0 else 0.0,
+        'bytesPerFrame': float(np.mean(sizes)) if sizes else 0.0,
+        'stages': disp.metrics.percentiles(),
+    }
+
+def environment():
+    """Where the results came from: versions, machine and git commit"""
+    env = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    try:
+        env['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return env
+
+def run(modes=tuple(MODES), resolutions=RESOLUTIONS, asyncModes=(False, True),
+        frames=100, scene='animated', renderTime=0.0, client=None):
+    """Benchmarks all combinations; returns {'environment': ..., 'results': [...]}"""
+    results = []
+    for res in resolutions:
+        for mode in modes:
+            for runAsync in asyncModes:
+                if MODES[mode].get('pipelined') and not runAsync:
+                    continue
+                results.append(runOne(mode, res, runAsync, frames, scene,
+                    renderTime, client))
+    return {'environment': environment(), 'results': results}
+
+def _table(results):
+    lines = ['%-15s %-10s %-5s %8s %12s %9s %9s' % ('mode', 'resolution',
+        'async', 'fps', 'bytes/frame', 'frame p50', 'frame p99')]
+    for r in results:
+        f = r['stages'].get('frame', {'p50': 0.0, 'p99': 0.0})
+        lines.append('%-15s %-10s %-5s %8.1f %12.0f %7.2fms %7.2fms' % (r['mode'],
+            '%dx%d' % tuple(r['resolution']), r['async'], r['fps'],
+            r['bytesPerFrame'], 1e3*f['p50'], 1e3*f['p99']))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ipyparaview.benchmarks.display')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--scene', choices=SCENES, default='animated')
+    parser.add_argument('--render-time', type=float, default=0.0,
+            help='simulated render time per frame, s')
+    parser.add_argument('--resolutions', default=','.join('%dx%d' % r for r in RESOLUTIONS))
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--dask', action='store_true',
+            help='render on a mock PVRenderActor in a local Dask cluster')
+    args = parser.parse_args(argv)
+
+    client = None
+    if args.dask:
+        from dask.distributed import Client, LocalCluster
+        client = Client(LocalCluster(n_workers=1, processes=False,
+            dashboard_address=None))
+
+    resolutions = [tuple(int(v) for v in r.split('x')) for r in args.resolutions.split(',')]
+    out = run(args.modes.split(','), resolutions, frames=args.frames,
+            scene=args.scene, renderTime=args.render_time, client=client)
+    if client is not None:
+        client.close()
+
+    print(_table(out['results']))
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(out, fp, indent=1)
+
+if __name__ == '__main__':
+    main()
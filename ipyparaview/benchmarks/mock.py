@@ -0,0 +1,213 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Stand-ins for ParaView and VTK, producing synthetic frames without a GPU,
+#X server or ParaView install:
+#
+#   pvs = MockParaView(size=(1280,720), scene='animated')
+#   disp = PVDisplay(pvs.CreateRenderView(), pvs=pvs, w2i=MockWindowToImage())
+#   actor = client.submit(PVRenderActor, 0, pvs=pvs, w2i=MockWindowToImage(),
+#           actor=True).result()
+import math
+import time
+import numpy as np
+
+__all__ = ['MockParaView', 'MockRenderView', 'MockWindowToImage', 'SCENES']
+
+#how the image changes from one render to the next, besides the camera:
+#   static    only with the camera; delta frames only send what the camera moved
+#   animated  the whole image, every frame
+#   partial   a small moving box, like a single animated actor
+SCENES = ('static', 'animated', 'partial')
+
+class _MockProxyManager:
+    #enough of vtkSMProxyManager for PVDisplay's renderOnDemand observer
+    def __init__(self):
+        self.observers = {}
+
+    def AddObserver(self, event, fn):
+        tag = len(self.observers)
+        self.observers[tag] = (event, fn)
+        return tag
+
+    def RemoveObserver(self, tag):
+        self.observers.pop(tag, None)
+
+    def InvokeEvent(self, event):
+        for e,fn in list(self.observers.values()):
+            if e == event:
+                fn(self, event)
+
+class _MockServerManager:
+    def __init__(self):
+        self.pxm = _MockProxyManager()
+
+    def ProxyManager(self):
+        return self
+
+    @property
+    def SMProxyManager(self):
+        return self.pxm
+
+class _MockProxy:
+    def __init__(self, view):
+        self.view = view
+
+    def GetRenderWindow(self):
+        return self.view
+
+class _MockCamera:
+    #enough of vtkCamera for cameraState
+    def __init__(self, view):
+        self.view = view
+
+    def GetClippingRange(self):
+        r = math.dist(self.view.CameraPosition, self.view.CameraFocalPoint)
+        return (0.5*r, 2.0*r)
+
+class MockRenderView:
+    """A render view drawing a synthetic image on render()
+
+    The image is a smooth pattern with some fine detail, so that it
+    compresses roughly like a rendering, scrolled by the camera azimuth.
+    Its depth is a dome in front of a background at the far plane.
+    renderTime adds that many seconds of simulated GPU time per render at
+    the initial size, in proportion to the pixel count at other sizes.
+    """
+    def __init__(self, size=(800,500), scene='animated', renderTime=0.0, seed=0):
+        if scene not in SCENES:
+            raise ValueError("scene must be one of %s" % (SCENES,))
+        self.ViewSize = list(size)
+        self.CameraPosition = [0.0, 0.0, 5.0]
+        self.CameraFocalPoint = [0.0, 0.0, 0.0]
+        self.CameraViewUp = [0.0, 1.0, 0.0]
+        self.CameraViewAngle = 30.0
+        self.ViewTime = 0.0
+        self.SMProxy = _MockProxy(self)
+        self.scene = scene
+        self.renderTime = renderTime
+        self.pixels = size[0]*size[1] #that renderTime is for
+        self.renders = 0
+        self.rng = np.random.default_rng(seed)
+        self.base = None
+        self.image = None #latest (h,w,3) RGB image
+        self.depth = None #(h,w) window depths, bottom-up like VTK's
+
+    def __pattern(self, w, h):
+        y,x = np.mgrid[0:h, 0:w].astype(np.float32)
+        r = 127.5 + 127.5*np.sin(2*math.pi*x/w)
+        g = 255.0*y/h
+        b = 127.5 + 127.5*np.cos(2*math.pi*(x+y)/(w+h)*3)
+        img = np.stack([r,g,b], axis=-1)
+        img += self.rng.normal(0, 6, img.shape) #surface detail
+        return np.clip(img, 0, 255).astype(np.uint8)
+
+    def render(self):
+        w,h = self.ViewSize
+        if self.base is None or self.base.shape[:2] != (h,w):
+            self.base = self.__pattern(w, h)
+        if self.renderTime:
+            time.sleep(self.renderTime*w*h/self.pixels)
+
+        p = np.subtract(self.CameraPosition, self.CameraFocalPoint)
+        shift = int(round(math.atan2(p[0], p[2])/(2*math.pi)*w))
+        if self.scene == 'animated':
+            shift += 4*self.renders
+        img = np.roll(self.base, shift, axis=1)
+        if self.scene == 'partial':
+            s = max(8, min(w,h)//10)
+            x = (4*self.renders) % max(1, w-s)
+            img[h//2:h//2+s, x:x+s] = (255, 64, 0)
+        self.image = img
+        self.renders += 1
+
+    def zbuffer(self):
+        h,w = self.image.shape[:2]
+        if self.depth is None or self.depth.shape != (h,w):
+            y,x = np.mgrid[0:h, 0:w].astype(np.float32)
+            d2 = ((x - w/2)**2 + (y - h/2)**2)/(0.4*min(w,h))**2
+            self.depth = np.where(d2 < 1, 0.6 - 0.2*np.sqrt(np.maximum(0, 1 - d2)),
+                    1.0).astype(np.float32)
+        return self.depth
+
+    def GetActiveCamera(self):
+        return _MockCamera(self)
+
+class MockParaView:
+    """The parts of paraview.simple that PVDisplay and PVRenderActor use
+
+    CreateRenderView() makes MockRenderViews with the keyword arguments
+    given here.
+    """
+    def __init__(self, **viewArgs):
+        self.viewArgs = viewArgs
+        self.servermanager = _MockServerManager()
+
+    def CreateRenderView(self):
+        return MockRenderView(**self.viewArgs)
+
+    def Render(self, view=None):
+        view.render()
+
+class _MockImage:
+    def __init__(self, scalars, w, h):
+        self.scalars, self.w, self.h = scalars, w, h
+
+    def GetDimensions(self):
+        return (self.w, self.h, 1)
+
+    def GetPointData(self):
+        return self
+
+    def GetScalars(self):
+        return self.scalars
+
+class MockWindowToImage:
+    """A vtkWindowToImageFilter reading back a MockRenderView"""
+    def __init__(self):
+        self.view = None
+        self.output = None
+        self.zbuffer = False
+
+    def SetInput(self, view):
+        self.view = view
+
+    def ReadFrontBufferOff(self):
+        pass
+
+    def ShouldRerenderOff(self):
+        pass
+
+    def SetInputBufferTypeToZBuffer(self):
+        self.zbuffer = True
+
+    def SetInputBufferTypeToRGB(self):
+        self.zbuffer = False
+
+    def Modified(self):
+        pass
+
+    def Update(self):
+        if self.view.image is None:
+            self.view.render()
+        h,w = self.view.image.shape[:2]
+        if self.zbuffer:
+            self.output = _MockImage(self.view.zbuffer().reshape(-1, 1), w, h)
+        else:
+            self.output = _MockImage(self.view.image.reshape(-1, 3), w, h)
+
+    def GetOutput(self):
+        return self.output
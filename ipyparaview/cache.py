@@ -0,0 +1,100 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Cache of encoded frames by camera, for views the user keeps coming back to
+import collections
+import math
+import threading
+import numpy as np
+
+__all__ = ['FrameCache']
+
+class FrameCache:
+    """An LRU cache of encoded frames, bounded by their total size in bytes
+
+    Frames are keyed by the camera, quantized so that floating point noise
+    in a camera the user returns to still hits, together with the view size
+    and a variant describing the encoding (codec, quality, ...).
+    Positions are rounded to precision times the camera's distance to its
+    focal point, rounded in turn to a power of two. Keys also carry the
+    generation, bumped by invalidate(), so a frame rendered before an
+    invalidation isn't cached after it.
+    """
+    def __init__(self, maxBytes=64*2**20, precision=1e-4):
+        self.maxBytes = maxBytes
+        self.precision = precision
+        self.entries = collections.OrderedDict() #key: bytes, oldest first
+        self.bytes = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+        self.evictions, self.invalidations = 0, 0
+
+    def key(self, position, focalPoint, viewUp, viewAngle, size, variant):
+        p = np.asarray(position, dtype=np.float64)
+        f = np.asarray(focalPoint, dtype=np.float64)
+        r = np.sqrt(np.sum((p-f)**2))
+        e = round(math.log2(r)) if r > 0 else 0
+        q = self.precision * 2.0**e
+        return (self.generation, e,
+                tuple(np.round(np.concatenate([p, f])/q).astype(np.int64)),
+                tuple(np.round(np.asarray(viewUp)/self.precision).astype(np.int64)),
+                round(viewAngle/self.precision), tuple(size), variant)
+
+    def get(self, key):
+        """Returns the cached frame for key, or None"""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.maxBytes:
+            return
+        with self.lock:
+            if key[0] != self.generation:
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self.entries[key] = value
+            self.bytes += len(value)
+            while self.bytes > self.maxBytes:
+                _,v = self.entries.popitem(last=False)
+                self.bytes -= len(v)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drops all frames, e.g. because the pipeline or data changed"""
+        with self.lock:
+            self.invalidations += 1
+            self.generation += 1
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hitRate': self.hits/lookups if lookups else 0.0,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'entries': len(self.entries), 'bytes': self.bytes,
+                    'maxBytes': self.maxBytes}
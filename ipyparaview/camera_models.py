@@ -1,68 +1,179 @@
 import math
 import numpy as np
 
-__all__ = ['rotateCameraTurntable', 'panCameraTurntable', 'zoomCameraTurntable']
+__all__ = ['rotateCameraTurntable', 'panCameraTurntable', 'zoomCameraTurntable',
+        'rotateCameraTurntableBatch', 'panCameraTurntableBatch',
+        'zoomCameraTurntableBatch', 'interpolateCameraPath', 'orbitCameraPath']
+
+#The batch kernels work on (3,N) arrays of x, y and z rows, which keeps the
+#per-event (N=1) case down to a few small ufunc calls; np.cross and
+#np.linalg.norm have far more overhead than arithmetic on the rows.
+def _cols(*vs):
+    #(3,) or (N,3) camera vectors as (3,1) or (3,N) float arrays
+    return [np.asarray(v, dtype=np.float64).reshape(-1,3).T for v in vs]
+
+def _rows(a, shape):
+    #(3,N) back to (N,3), broadcasting to shape first if needed
+    if a.shape != shape:
+        a = np.broadcast_to(a, shape)
+    return a.T
+
+def _dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+def _cross(a, b):
+    return np.array([a[1]*b[2] - a[2]*b[1],
+        a[2]*b[0] - a[0]*b[2],
+        a[0]*b[1] - a[1]*b[0]])
 
 def _normalize(v):
-    return v/np.linalg.norm(v)
+    return v/np.sqrt(_dot(v, v))
 
-def _cartToSphr(p):
-    #cartesian position into spherical
-    r = np.linalg.norm(p)
-    return np.array([r,
-        math.atan2(p[0], p[2]),
-        math.asin(p[1]/r)])
+def _clampedCumsum(x0, a, lo, hi):
+    #x[i] = clip(x[i-1] + a[i], lo, hi). Clamping doesn't commute with the
+    #sum, so once a bound is hit this has to go one step at a time.
+    x = x0 + np.cumsum(a)
+    if np.all((x >= lo) & (x <= hi)):
+        return x
+    for i,ai in enumerate(a):
+        x0 = min(hi, max(lo, x0 + ai))
+        x[i] = x0
+    return x
 
-def _sphrToCart(p):
-    #spherical coordinate position into cartesian
-    return np.array([p[0]*math.sin(p[1])*math.cos(p[2]),
-            p[0]*math.sin(p[2]),
-            p[0]*math.cos(p[1])*math.cos(p[2])])
+def rotateCameraTurntableBatch(d, p, f, u, scale, phiLimit, cumulative=False):
+    """Rotates cameras around their focus; the vectorized rotateCameraTurntable
 
-def rotateCameraTurntable(d, p, f, u, scale, phiLimit):
-    f = np.array(f)
-    p = np.array(p) - f
-
-    #compute orthonormal basis corresponding to current view and up vectors
-    b1 = _normalize(np.array(u))
-    b0 = _normalize(np.cross(b1, p))
-    b2 = np.cross(b0, b1)
-
-    #compute matrices to convert to and from the up-vector basis
-    fromU = np.column_stack([b0,b1,b2])
-    toU = np.linalg.inv(fromU)
-
-    #rotate around the focus in spherical:
-    # - convert focus-relative camera pos to up vector basis, then spherical
-    # - apply mouse deltas as movements in spherical
-    # - convert back to cartesian, then to standard basis, then to absolute position
-    cp = _cartToSphr( np.matmul(toU,p) )
-    cp[1] -= scale*d['x']
-    cp[2] = max(-phiLimit, min(phiLimit, cp[2]-scale*d['y']))
-    p = np.matmul( fromU, _sphrToCart(cp) )
-
-    #self.render()
-    return (p+f, f, u)
+    d is an (N,2) array of mouse deltas (x,y), and p, f, u are (3,) or (N,3)
+    camera positions, focal points and view-up vectors, broadcast against d.
+    With cumulative=True, the deltas are instead applied one after another
+    to a single camera, and row i is the camera after deltas 0..i.
+    Returns (N,3) arrays (p, f, u).
+    """
+    dx,dy = np.asarray(d, dtype=np.float64).reshape(-1,2).T
+    f,p,u = _cols(f, p, u)
+    p = p - f
+
+    #orthonormal basis for the current view and up vectors. The inverse of
+    #an orthonormal basis is its transpose, so converting to it is a
+    #projection; by construction p has no b0 component, so its azimuth in
+    #this basis is always zero.
+    b1 = _normalize(u)
+    b0 = _normalize(_cross(b1, p))
+    b2 = _cross(b0, b1)
+    r = np.sqrt(_dot(p, p))
+    phi = np.arcsin(_dot(p, b1)/r)
+
+    #apply mouse deltas as movements in spherical
+    if cumulative:
+        theta = -scale*np.cumsum(dx)
+        phi = _clampedCumsum(phi[0], -scale*dy, -phiLimit, phiLimit)
+    else:
+        theta = -scale*dx
+        phi = np.clip(phi - scale*dy, -phiLimit, phiLimit)
+
+    #back to cartesian in the up vector basis, then the standard basis
+    c = r*np.cos(phi)
+    p = c*np.sin(theta)*b0 + r*np.sin(phi)*b1 + c*np.cos(theta)*b2 + f
+    return (p.T, _rows(f, p.shape), _rows(u, p.shape))
+
+def panCameraTurntableBatch(d, p, f, u, angle, cumulative=False):
+    """Pans cameras parallel to the view plane; the vectorized panCameraTurntable
+
+    Arguments and results are as for rotateCameraTurntableBatch.
+    """
+    dx,dy = np.asarray(d, dtype=np.float64).reshape(-1,2).T
+    f,p,u = _cols(f, p, u)
+    p = p - f
 
-def panCameraTurntable(d, p, f, u, angle):
     #translates pan delta into a translation vector at the focal point
-    f = np.array(f)
-    p = np.array(p)-f
-    u = np.array(u)
+    h = _normalize(_cross(p, u))
+    v = _normalize(_cross(p, h))
+    if cumulative:
+        dx,dy = np.cumsum(dx), np.cumsum(dy) #panning keeps h, v and |p|
+    s = np.sqrt(_dot(p, p))*2*math.tan(math.pi*angle/360)
+    f = f + (dx*h + dy*v)*s
+
+    p = p + f
+    return (p.T, f.T, _rows(u, p.shape))
 
-    h = _normalize(np.cross(p, u))
-    v = _normalize(np.cross(p, h))
+def zoomCameraTurntableBatch(d, p, f, u, rlimit, cumulative=False):
+    """Zooms cameras towards their focus; the vectorized zoomCameraTurntable
 
-    f += (d['x']*h + d['y']*v)*np.linalg.norm(p)*2*math.tan(math.pi*angle/360)
+    d is an (N,) array of zoom factors; other arguments and results are as
+    for rotateCameraTurntableBatch.
+    """
+    d = np.asarray(d, dtype=np.float64).reshape(-1)
+    f,p,u = _cols(f, p, u)
+    p = p - f
+    r = np.sqrt(_dot(p, p))
 
-    #self.render()
-    return (p+f, f, u)
+    if cumulative:
+        #log r[i] = max(log rlimit, log r[i-1] + log d[i]); a cumsum clamped
+        #from one side only has a closed form
+        s = np.cumsum(np.log(d))
+        rz = np.exp(s + np.maximum(np.log(r[0]),
+            np.maximum.accumulate(math.log(rlimit) - s)))
+    else:
+        rz = np.maximum(rlimit, r*d)
+
+    p = p*(rz/r) + f
+    return (p.T, _rows(f, p.shape), _rows(u, p.shape))
+
+def rotateCameraTurntable(d, p, f, u, scale, phiLimit):
+    p,f,_ = rotateCameraTurntableBatch([d['x'], d['y']], p, f, u, scale, phiLimit)
+    return (p[0], f[0], u)
+
+def panCameraTurntable(d, p, f, u, angle):
+    p,f,_ = panCameraTurntableBatch([d['x'], d['y']], p, f, u, angle)
+    return (p[0], f[0], np.array(u))
 
 def zoomCameraTurntable(d, p, f, u, rlimit):
-    #zooms by scaling the distance between camera and focus
-    f = np.array(f)
-    p = np.array(p)-f
-    r = np.linalg.norm(p)
-    p *= max(rlimit, r*d)/r
+    #a single zoom is a few multiplies, which the batch kernel's array setup
+    #would cost several times over, so this stays scalar
+    x,y,z = (p[0]-f[0], p[1]-f[1], p[2]-f[2])
+    r = math.sqrt(x*x + y*y + z*z)
+    s = max(rlimit, r*d)/r
+    return (np.array([x*s + f[0], y*s + f[1], z*s + f[2]]),
+            np.array(f, dtype=np.float64), u)
+
+def interpolateCameraPath(keyframes, n):
+    """Interpolates n cameras along a list of (p, f, u) keyframe cameras
+
+    Positions are interpolated in turntable coordinates around the first
+    keyframe's view-up: azimuth, elevation and log distance to the focal
+    point, so that keyframes on an orbit give a path along the orbit. Focal
+    points and view-up vectors are interpolated linearly. The first and last
+    cameras are the first and last keyframes. Returns (n,3) arrays (p, f, u).
+    """
+    f,p,u = _cols(*[[k[i] for k in keyframes] for i in (1,0,2)])
+    p = p - f
+
+    #turntable basis of the first keyframe, as in rotateCameraTurntableBatch
+    b1 = _normalize(u[:,:1])
+    b0 = _normalize(_cross(b1, p[:,:1]))
+    b2 = _cross(b0, b1)
+    r = np.sqrt(_dot(p, p))
+    theta = np.unwrap(np.arctan2(_dot(p, b0), _dot(p, b2)))
+    phi = np.arcsin(_dot(p, b1)/r)
+
+    #interpolate all keyframes in one go
+    t = np.linspace(0, len(keyframes)-1, n)
+    k = np.arange(len(keyframes))
+    theta, phi = np.interp(t, k, theta), np.interp(t, k, phi)
+    r = np.exp(np.interp(t, k, np.log(r)))
+    f = np.array([np.interp(t, k, c) for c in f])
+    u = np.array([np.interp(t, k, c) for c in u])
+
+    c = r*np.cos(phi)
+    p = c*np.sin(theta)*b0 + r*np.sin(phi)*b1 + c*np.cos(theta)*b2 + f
+    return (p.T, f.T, u.T)
+
+def orbitCameraPath(p, f, u, n, degrees=360.0):
+    """n cameras turning the camera (p, f, u) by degrees around its view-up
 
-    return (p+f, f, u)
+    The last camera stops one step short of the full turn, so that a 360
+    degree orbit loops seamlessly. Returns (n,3) arrays (p, f, u).
+    """
+    d = np.zeros((n,2))
+    d[1:,0] = -math.radians(degrees)/n #turntable azimuth moves by -scale*dx
+    return rotateCameraTurntableBatch(d, p, f, u, 1.0, math.pi/2, cumulative=True)
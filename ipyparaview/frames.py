@@ -0,0 +1,256 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Helpers for moving frames from the render window to the frontend
+import struct
+import threading
+import zlib
+from io import BytesIO
+import numpy as np
+from PIL import Image, features
+
+class FrameRing:
+    """A ring of preallocated frame buffers for readback to write into
+
+    Buffers are only (re)allocated when the frame shape changes; the number of
+    allocations is counted in `allocations`. A buffer handed out by get() is
+    overwritten `slots` calls later, so slots must cover every frame that can
+    be in flight at once.
+    """
+    def __init__(self, slots=1, channels=4):
+        self.slots, self.channels = slots, channels
+        self.buffers = []
+        self.next = 0
+        self.slot = None #slot of the buffer get() returned last
+        self.allocations = 0
+
+    def get(self, w, h):
+        """Returns the next (h,w,channels) uint8 buffer in the ring"""
+        if not self.buffers or self.buffers[0].shape != (h,w,self.channels):
+            self.buffers = [] #no references left when _allocate frees them
+            self.buffers = self._allocate(w, h)
+            self.next = 0
+        self.slot = self.next
+        buf = self.buffers[self.next]
+        self.next = (self.next+1) % self.slots
+        return buf
+
+    def _allocate(self, w, h):
+        #returns the buffers of all slots; subclasses may place them elsewhere
+        return [self._opaque(np.empty((h,w,self.channels), dtype=np.uint8))
+                for _ in range(self.slots)]
+
+    def _opaque(self, buf):
+        if self.channels == 4:
+            buf[:,:,3] = 255 #readback only writes RGB, so alpha stays opaque
+        self.allocations += 1
+        return buf
+
+def readFrame(w2i, ring):
+    """Reads the render window behind w2i into the next buffer of ring
+
+    The VTK image is wrapped without copying, and flipped to top-down row
+    order and expanded to the ring's channel count in a single pass.
+    """
+    # Mathias's magic frame fetching snippet
+    w2i.Modified()
+    w2i.Update()
+    imagedata = w2i.GetOutput()
+    w,h,_ = imagedata.GetDimensions()
+    src = imagedata.GetPointData().GetScalars()
+    if not isinstance(src, np.ndarray): #stand-ins may hand over numpy arrays
+        from vtk.util.numpy_support import vtk_to_numpy
+        src = vtk_to_numpy(src)
+    src = src.reshape((h,w,3))
+    out = ring.get(w, h)
+    np.copyto(out[:,:,:3], src[::-1])
+    return out
+
+def readDepth(w2i):
+    """Reads the z-buffer of the render window behind w2i
+
+    Returns an (h,w) float32 array of window depths from 0 (near plane) to
+    1 (far plane and background) in top-down row order. w2i reads RGB
+    again afterwards.
+    """
+    w2i.SetInputBufferTypeToZBuffer()
+    try:
+        w2i.Modified()
+        w2i.Update()
+        imagedata = w2i.GetOutput()
+        w,h,_ = imagedata.GetDimensions()
+        src = imagedata.GetPointData().GetScalars()
+        if not isinstance(src, np.ndarray):
+            from vtk.util.numpy_support import vtk_to_numpy
+            src = vtk_to_numpy(src)
+        return np.array(src.reshape((h,w))[::-1], dtype=np.float32)
+    finally:
+        w2i.SetInputBufferTypeToRGB()
+
+def quantizeDepth(depth):
+    """Quantizes window depths in [0,1] to uint16, 0xffff being the far plane"""
+    return np.round(np.clip(depth, 0.0, 1.0)*0xffff).astype('<u2')
+
+def packDepth(depth, step=1):
+    """Packs window depths, subsampled by step, for the frontend
+
+    The format is a header of width and height (little-endian uint16),
+    followed by the zlib compressed, little-endian uint16 quantized depths
+    in row-major order.
+    """
+    q = quantizeDepth(depth[::step, ::step])
+    h,w = q.shape
+    return struct.pack('<2H', w, h) + zlib.compress(q.tobytes(), 1)
+
+def cameraState(view):
+    """The camera of a render view, as sent along with each frame for the
+    frontend to reproject: position, focal point, view up, view angle (in
+    degrees) and the near and far clipping planes the depths refer to
+    """
+    return {'position': [float(v) for v in view.CameraPosition],
+            'focalPoint': [float(v) for v in view.CameraFocalPoint],
+            'viewUp': [float(v) for v in view.CameraViewUp],
+            'viewAngle': float(view.CameraViewAngle),
+            'clippingRange': [float(v) for v in
+                view.GetActiveCamera().GetClippingRange()]}
+
+def encodeFrame(frame, codec='jpeg', quality=50, **options):
+    """Encodes an (h,w,3) or (h,w,4) uint8 frame with PIL, returning the bytes
+
+    Extra options are passed on to the PIL encoder.
+    """
+    h,w,c = frame.shape
+    if codec == 'jpeg' and c == 4 and frame.flags['C_CONTIGUOUS']:
+        #encode straight from the readback buffer; JPEG skips the X byte
+        img = Image.frombuffer('RGBX', (w,h), frame, 'raw', 'RGBX', 0, 1)
+    else:
+        img = Image.fromarray(frame[:,:,:3])
+    bytesIO = BytesIO()
+    img.save(bytesIO, format=codec, quality=quality, **options)
+    return bytesIO.getvalue()
+
+def resizeFrame(frame, size):
+    """Scales an (h,w,c) uint8 frame to size (w,h), returning a new frame"""
+    h,w,c = frame.shape
+    if (w,h) == tuple(size):
+        return frame
+    img = Image.fromarray(np.ascontiguousarray(frame), 'RGBA' if c == 4 else 'RGB')
+    return np.asarray(img.resize(tuple(size), Image.BILINEAR))
+
+class TileDiffer:
+    """Diffs frames against the last frame sent, one square tile at a time
+
+    The packed tile format (all fields little-endian uint16) is a header of
+    frame width, frame height, channels and tile count, followed by x, y,
+    width and height for each tile, followed by the row-major pixel data of
+    each tile in the same order. A diff with more tiles than the count can
+    hold is sent as a single full frame tile instead. reset() may be called
+    from any thread; it bumps `generation`, and `diffGeneration` is the
+    generation of the latest diff, so tiles diffed before a reset can be
+    told apart from the full frame after it.
+    """
+    maxTiles = 0xFFFF #what the tile count of the packed format holds
+
+    def __init__(self, tileSize=64):
+        if not 1 <= tileSize <= 0xFFFF:
+            raise ValueError("tileSize must be between 1 and 65535")
+        self.tileSize = tileSize
+        self.last = None #copy of the last frame sent; None forces a full frame
+        self.generation = 0 #resets so far
+        self.diffGeneration = 0 #generation of the latest diff
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Forget the last frame, so that the next diff sends everything"""
+        with self.lock:
+            self.last = None
+            self.generation += 1
+
+    def diff(self, frame):
+        """Returns a list of (x, y, tile) for the tiles of frame that changed"""
+        with self.lock:
+            self.diffGeneration = self.generation
+            return self.__diff(frame)
+
+    def __diff(self, frame):
+        h,w = frame.shape[:2]
+        ts = self.tileSize
+        if self.last is None or self.last.shape != frame.shape:
+            self.last = frame.copy()
+            return [(0, 0, frame)]
+
+        #reduce the per-pixel change mask to one flag per tile; reduceat
+        #handles the partial tiles along the right and bottom edges
+        changed = np.any(frame != self.last, axis=2)
+        ys, xs = np.arange(0, h, ts), np.arange(0, w, ts)
+        changed = np.logical_or.reduceat(changed, ys, axis=0)
+        changed = np.logical_or.reduceat(changed, xs, axis=1)
+        if np.count_nonzero(changed) > self.maxTiles:
+            self.last[...] = frame
+            return [(0, 0, frame)]
+
+        tiles = []
+        for ty,tx in zip(*np.nonzero(changed)):
+            y,x = ys[ty], xs[tx]
+            tile = frame[y:y+ts, x:x+ts]
+            self.last[y:y+ts, x:x+ts] = tile
+            tiles.append((x, y, tile))
+        return tiles
+
+    @staticmethod
+    def pack(frame, tiles):
+        """Packs the given tiles of frame into a single bytes object"""
+        h,w,c = frame.shape
+        parts = [struct.pack('<4H', w, h, c, len(tiles))]
+        parts += [struct.pack('<4H', x, y, t.shape[1], t.shape[0])
+                for x,y,t in tiles]
+        parts += [np.ascontiguousarray(t).tobytes() for _,_,t in tiles]
+        return b''.join(parts)
+
+#Codecs for compressed frames, by name: (encode(frame, quality) -> bytes,
+#lossless). The frontend has a decoder for each of the codecs registered
+#here; see frameDecoders in widgets.js.
+CODECS = {}
+
+def registerCodec(name, encode, lossless=False):
+    """Makes encode(frame, quality) available as the codec name
+
+    encode gets an (h,w,3) or (h,w,4) uint8 frame and a quality from 1 to
+    100, which lossless codecs may ignore, and returns the encoded bytes.
+    """
+    CODECS[name] = (encode, lossless)
+
+def compressFrame(frame, codec='jpeg', quality=50):
+    """Encodes frame with a registered codec, returning the bytes"""
+    if codec not in CODECS:
+        raise ValueError("unknown codec %r; registered are %s" % (codec, sorted(CODECS)))
+    return CODECS[codec][0](frame, quality)
+
+def _packRaw(frame, quality=None):
+    #a single full frame tile, so the frontend draws it like delta tiles
+    rgb = frame[:,:,:3]
+    return TileDiffer.pack(rgb, [(0, 0, rgb)])
+
+registerCodec('raw', _packRaw, lossless=True)
+registerCodec('zlib', lambda f,q: zlib.compress(_packRaw(f), 1), lossless=True)
+registerCodec('png', lambda f,q: encodeFrame(f, 'png', compress_level=1), lossless=True)
+registerCodec('jpeg', lambda f,q: encodeFrame(f, 'jpeg', q))
+if features.check('webp'):
+    registerCodec('webp', lambda f,q: encodeFrame(f, 'webp', q, method=0))
+
+#(codec, quality) pairs the automatic codec mode picks from, best first
+AUTO_CODECS = [('raw', 100), ('zlib', 100), ('png', 100), ('webp', 90),
+        ('jpeg', 90), ('jpeg', 75), ('webp', 60), ('jpeg', 50), ('jpeg', 30)]
@@ -0,0 +1,143 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Timing instrumentation for the frame path of PVDisplay
+import collections
+import threading
+import time
+import numpy as np
+
+__all__ = ['FrameMetrics', 'FrameTimer']
+
+class FrameTimer:
+    """Durations of the stages of one frame, in seconds
+
+    lap(stage) ends a stage that started at the previous lap. Stages that
+    run elsewhere, like encoding on a pipeline worker, are timed with
+    time.perf_counter() and added to stages directly.
+    """
+    def __init__(self):
+        self.start = self.t = time.perf_counter()
+        self.stages = {}
+        self.stamp = None #client time of the oldest event in this frame, ms
+        self.size = None #(w,h) the frame is rendered at, if not the default
+        self.scale = 1.0 #resolution scale the frame is rendered at
+        self.codec = None #(codec, quality, step) of a compressed frame
+        self.depth = None #packed depth of the frame; see frames.packDepth
+        self.camera = None #the camera the frame was rendered with
+        self.applied = None #client time of the newest event in the camera, ms
+        self.tiles = None #TileDiffer generation of a frame of delta tiles
+
+    def lap(self, stage):
+        t = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + t - self.t
+        self.t = t
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+class FrameMetrics:
+    """Recent per-stage frame timings and motion-to-photon latencies
+
+    Keeps the last size samples of each stage. Samples are in seconds;
+    stages are whatever the display records, e.g.:
+        wake      from the view becoming dirty to the start of its frame
+        camera    applying the coalesced camera events
+        render    pvs.Render (Jupyter mode)
+        readback  reading back the frame; in Dask mode, the round trip to
+                  the actors, which render on the way
+        depth     reading back and packing the depth (Jupyter mode)
+        actorRender, actorReadback, actorEncode, actorDepth
+                  the same stages timed on the rank 0 actor (Dask mode)
+        encode    compressing or packing the frame; for compressed frames in
+                  Dask mode, waiting for the frame the actors encoded
+        publish   handing the frame to the comm or the frame listeners
+        frame     from the start of the frame to the end of publishing
+        latency   from a mouse event on the client to the first frame with
+                  its camera update drawn on the client
+        decode    decoding a frame in the frontend's decode worker
+        rtt       from sending a frame over the comm to the frontend
+                  acknowledging that it's drawn
+        inFlight  frames sent over the comm and not acknowledged yet, as of
+                  sending one; a count, not seconds
+    Hooks are called with a {stage: seconds} dict for every frame, and with
+    {'latency': seconds}, {'decode': seconds}, {'rtt': seconds} or
+    {'inFlight': count} for every
+    sample of those, from whichever thread recorded them.
+    """
+    counts = ('inFlight',) #stages that aren't durations
+
+    def __init__(self, size=512):
+        self.size = size
+        self.samples = collections.defaultdict(
+                lambda: collections.deque(maxlen=self.size))
+        self.hooks = []
+        self.lock = threading.Lock()
+
+    def addHook(self, fn):
+        self.hooks.append(fn)
+
+    def removeHook(self, fn):
+        self.hooks.remove(fn)
+
+    def record(self, stages):
+        """Adds a {stage: seconds} sample for each stage and runs the hooks"""
+        with self.lock:
+            for k,v in stages.items():
+                self.samples[k].append(v)
+        for fn in list(self.hooks):
+            fn(stages)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def stages(self):
+        with self.lock:
+            return list(self.samples)
+
+    def values(self, stage):
+        """The recorded samples of stage, oldest first, as an array"""
+        with self.lock:
+            return np.array(self.samples.get(stage, ()), dtype=np.float64)
+
+    def percentiles(self, q=(50, 90, 99), stages=None):
+        """{stage: {'p50': seconds, ..., 'count': n}} for the recorded stages"""
+        result = {}
+        for stage in (self.stages() if stages is None else stages):
+            v = self.values(stage)
+            if len(v) == 0:
+                continue
+            p = np.percentile(v, q)
+            result[stage] = dict(('p%g' % k, float(x)) for k,x in zip(q, p))
+            result[stage]['count'] = len(v)
+        return result
+
+    def histogram(self, stage, bins=20):
+        """(counts, bin edges) of the recorded samples of stage"""
+        return np.histogram(self.values(stage), bins=bins)
+
+    def summary(self):
+        """A text table of the median, p90 and p99 of each stage, in ms
+
+        Counts are shown as they are.
+        """
+        lines = ['%-14s %8s %8s %8s %6s' % ('stage', 'p50', 'p90', 'p99', 'n')]
+        for stage,p in sorted(self.percentiles().items()):
+            k = 1.0 if stage in self.counts else 1e3
+            lines.append('%-14s %8.2f %8.2f %8.2f %6d' % (stage,
+                k*p['p50'], k*p['p90'], k*p['p99'], p['count']))
+        return '\n'.join(lines)
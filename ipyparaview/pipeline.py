@@ -0,0 +1,176 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Staged frame pipeline: render/readback -> encode -> publish
+import collections
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+
+class FramePipeline:
+    """Overlaps encoding and publishing of frames with rendering the next one
+
+    Frames are submitted in order from the render thread. encode(item) runs
+    in a thread pool, and publish(encoded) runs on a dedicated thread,
+    strictly in submission order. At most `depth` frames are in flight; when
+    a new frame arrives at a full pipeline, the oldest frame is dropped
+    rather than queued, and a frame is also dropped if a newer one finished
+    encoding while it waited to be published. dropped(item), if given, is
+    called with each dropped item, for frames that later ones depend on.
+    """
+    def __init__(self, encode, publish, depth=2, workers=2, dropped=None):
+        self.encode, self.publish = encode, publish
+        self.onDrop = dropped
+        self.depth, self.workers = depth, workers
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.inflight = collections.deque() #(encode future, item), oldest first
+        self.cv = threading.Condition()
+        self.running = True
+        self.submitted, self.published, self.dropped = 0, 0, 0
+        self.t0 = time.time() #time of the first submitted frame
+        self.tp = self.t0 #time of the latest published frame
+        self.error = None #latest exception raised by encode or publish
+
+        self.publisher = threading.Thread(target=self.__publishLoop, daemon=True)
+        self.publisher.start()
+
+    def submit(self, item):
+        """Queue item for encoding and publishing; never blocks on full queues"""
+        fut = self.pool.submit(self.encode, item)
+        with self.cv:
+            if self.submitted == 0:
+                self.t0 = time.time()
+            self.submitted += 1
+            self.inflight.append((fut, item))
+            drops = []
+            while len(self.inflight) > self.depth:
+                old, oldItem = self.inflight.popleft()
+                old.cancel()
+                drops.append(oldItem)
+                self.dropped += 1
+            self.cv.notify_all()
+        self.__dropped(drops)
+
+    def throughput(self):
+        """Published frames per second since the first frame was submitted"""
+        with self.cv:
+            return self.published/max(1e-9, self.tp - self.t0)
+
+    def stats(self):
+        with self.cv:
+            return {'submitted': self.submitted,
+                    'published': self.published,
+                    'dropped': self.dropped,
+                    'inflight': len(self.inflight)}
+
+    def close(self):
+        """Publish what's in flight, then stop the publisher and encoders"""
+        with self.cv:
+            self.running = False
+            self.cv.notify_all()
+        self.publisher.join()
+        self.pool.shutdown()
+
+    def __publishLoop(self):
+        while True:
+            with self.cv:
+                while self.running and not self.inflight:
+                    self.cv.wait()
+                if not self.inflight:
+                    return
+                fut = self.inflight[0][0]
+
+            wait([fut])
+
+            drops = []
+            with self.cv:
+                if not self.inflight or self.inflight[0][0] is not fut:
+                    continue #dropped by submit() while we were waiting
+                _, item = self.inflight.popleft()
+                #publish the newest finished frame; older ones are stale
+                while self.inflight and self.inflight[0][0].done():
+                    drops.append(item)
+                    fut, item = self.inflight.popleft()
+                    self.dropped += 1
+            self.__dropped(drops)
+
+            if fut.cancelled():
+                continue
+            try:
+                self.publish(fut.result())
+            except Exception as e:
+                self.error = e
+                traceback.print_exc()
+                continue
+            with self.cv:
+                self.published += 1
+                self.tp = time.time()
+
+    def __dropped(self, items):
+        if self.onDrop is None:
+            return
+        for item in items:
+            try:
+                self.onDrop(item)
+            except Exception as e:
+                self.error = e
+                traceback.print_exc()
+
+class FrameWindow:
+    """Tracks the frames sent to the frontend that it hasn't drawn yet
+
+    Acknowledgements are cumulative: acknowledging frame n also covers the
+    frames before it, which the frontend may have skipped. Frames not
+    acknowledged within timeout seconds count as lost. The window only
+    limits anything once a frontend has acknowledged a frame, so that
+    displays nobody looks at, and older frontends, aren't held back.
+    """
+    def __init__(self, timeout=2.0):
+        self.timeout = timeout
+        self.pending = collections.OrderedDict() #frame number: time sent
+        self.active = False #True once a frame was acknowledged
+        self.lock = threading.Lock()
+
+    def sent(self, n):
+        with self.lock:
+            self.pending[n] = time.perf_counter()
+
+    def acked(self, n):
+        """Record that frame n was drawn; returns its round trip in s, or None"""
+        with self.lock:
+            self.active = True
+            t = self.pending.get(n)
+            while self.pending and next(iter(self.pending)) <= n:
+                self.pending.popitem(last=False)
+        return None if t is None else time.perf_counter() - t
+
+    def inFlight(self):
+        """The number of frames sent and neither acknowledged nor lost"""
+        with self.lock:
+            t = time.perf_counter() - self.timeout
+            while self.pending and next(iter(self.pending.values())) < t:
+                self.pending.popitem(last=False)
+            return len(self.pending)
+
+    def full(self, depth):
+        """True if depth frames are in flight; depth 0 never is"""
+        return self.active and depth > 0 and self.inFlight() >= depth
+
+    def reset(self):
+        """Forget the frames in flight, e.g. because the frontend reloaded"""
+        with self.lock:
+            self.pending.clear()
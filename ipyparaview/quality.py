@@ -0,0 +1,189 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Controllers that trade frame quality for interactivity
+import collections
+import math
+import time
+import numpy as np
+
+class InteractionQuality:
+    """Tracks whether the user is interacting, and when to send a refined frame
+
+    Frames rendered within `delay` seconds of the latest interaction event
+    are previews; the first frame after that is the refinement, after which
+    nothing is pending until the next event.
+    """
+    def __init__(self):
+        self.tlast = 0.0 #time of the latest interaction event
+        self.pending = False #True if a refined frame hasn't been sent yet
+
+    def interact(self):
+        """Record an interaction event"""
+        self.tlast = time.time()
+        self.pending = True
+
+    def interacting(self, delay):
+        """True if the latest interaction event was less than delay s ago"""
+        return time.time() - self.tlast < delay
+
+    def refineIn(self, delay):
+        """Seconds until the refined frame is due, or None if none is pending"""
+        if not self.pending:
+            return None
+        return max(0.0, self.tlast + delay - time.time())
+
+    def refined(self):
+        """Record that a full quality frame was sent"""
+        self.pending = False
+
+class ResolutionController:
+    """Picks the render resolution scale that holds a target frame rate
+
+    Frame cost (render, readback and encode time) is taken to grow with
+    the pixel count, i.e. with scale**2, so each measurement is converted
+    to the cost of a full resolution frame and smoothed. The scale for a
+    target rate is then sqrt(1/(fps*cost)), clamped to the bounds and
+    rounded down to a multiple of step, so that the view size doesn't
+    change on every frame.
+    """
+    def __init__(self, smoothing=0.3, step=1.0/16):
+        self.smoothing = smoothing #weight of the newest measurement
+        self.step = step
+        self.fullCost = None #smoothed s per full resolution frame
+
+    def update(self, seconds, scale):
+        """Record that a frame rendered at scale cost seconds"""
+        cost = seconds/(scale*scale)
+        if self.fullCost is None:
+            self.fullCost = cost
+        else:
+            self.fullCost += self.smoothing*(cost - self.fullCost)
+
+    def scale(self, fps, lo, hi):
+        """The scale to render the next frame at to reach fps"""
+        if not self.fullCost:
+            return hi
+        s = math.sqrt(1.0/(fps*self.fullCost))
+        s = math.floor(s/self.step)*self.step
+        return min(hi, max(lo, s))
+
+    def reset(self):
+        self.fullCost = None
+
+class BandwidthEstimator:
+    """Estimates the bandwidth to the frontend from acknowledged frames
+
+    The delay from sending a frame to the frontend acknowledging it is taken
+    to be a fixed round trip plus size/bandwidth, fit over the last window
+    acknowledged frames. The fit needs frames of different sizes; until
+    there are some, and if larger frames don't take longer to arrive, the
+    bandwidth is infinite. Without a fit, the last one is kept.
+    """
+    def __init__(self, window=64):
+        self.window = window
+        self.sentAt = collections.OrderedDict() #frame number: (time, bytes)
+        self.samples = collections.deque(maxlen=window) #(bytes, delay)
+        self.estimate = math.inf #bytes/s
+
+    def sent(self, n, nbytes):
+        """Record that frame n of nbytes was sent"""
+        self.sentAt[n] = (time.perf_counter(), nbytes)
+        while len(self.sentAt) > 4*self.window: #never acknowledged
+            self.sentAt.popitem(last=False)
+
+    def acked(self, n):
+        """Record that frame n arrived; returns its delay, or None if unknown"""
+        sent = self.sentAt.pop(n, None)
+        if sent is None:
+            return None
+        t,nbytes = sent
+        delay = time.perf_counter() - t
+        self.samples.append((nbytes, delay))
+        return delay
+
+    def bandwidth(self):
+        """Bytes/s, as fit to the recent delays"""
+        if len(self.samples) >= 4:
+            b,d = np.array(self.samples, dtype=np.float64).T
+            if np.ptp(b) > 0.25*np.mean(b):
+                slope = np.cov(b, d)[0,1]/np.var(b, ddof=1)
+                self.estimate = 1.0/slope if slope > 0 else math.inf
+        return self.estimate
+
+class CodecSelector:
+    """Picks the codec and quality that deliver the most frames/s
+
+    candidates are (codec, quality) pairs, best looking first. Frames
+    encoded with a candidate update its encode time and size per pixel.
+    Rendering plus encoding and the transfer of the previous frame overlap,
+    so a frame is predicted to take the longer of the two; the pick is the
+    best looking candidate within tolerance of the highest predicted rate,
+    capped at the display's fps limit. Every probeEvery picks, the
+    candidate measured least recently is tried instead, so that estimates
+    follow the scene and the link.
+    """
+    def __init__(self, candidates, smoothing=0.3, tolerance=0.1, probeEvery=30):
+        self.candidates = list(candidates)
+        self.smoothing = smoothing #weight of the newest measurement
+        self.tolerance = tolerance
+        self.probeEvery = probeEvery
+        self.costs = {} #candidate: [s/pixel to encode, bytes/pixel]
+        self.measured = {} #candidate: pick count when last measured
+        self.overhead = None #smoothed render and readback s/pixel
+        self.picks = 0
+
+    def update(self, candidate, pixels, encodeSeconds, nbytes, overheadSeconds):
+        """Record a frame of pixels encoded with candidate"""
+        if candidate not in self.candidates or pixels <= 0:
+            return
+        new = [encodeSeconds/pixels, nbytes/pixels]
+        old = self.costs.get(candidate)
+        if old is None:
+            self.costs[candidate] = new
+        else:
+            self.costs[candidate] = [o + self.smoothing*(n-o) for o,n in zip(old, new)]
+        o = overheadSeconds/pixels
+        self.overhead = o if self.overhead is None else \
+                self.overhead + self.smoothing*(o - self.overhead)
+        self.measured[candidate] = self.picks
+
+    def fps(self, candidate, pixels, bandwidth, fpsLimit):
+        """Predicted frames/s with candidate, or None if it's unmeasured"""
+        cost = self.costs.get(candidate)
+        if cost is None:
+            return None
+        encode, size = cost
+        t = max((self.overhead + encode)*pixels, size*pixels/bandwidth)
+        return fpsLimit if t <= 0 else min(fpsLimit, 1.0/t)
+
+    def choose(self, pixels, bandwidth, fpsLimit):
+        """The (codec, quality) to encode the next frame of pixels with"""
+        self.picks += 1
+        unmeasured = [c for c in self.candidates if c not in self.costs]
+        if unmeasured:
+            return unmeasured[0]
+        if self.picks % self.probeEvery == 0:
+            return min(self.candidates, key=lambda c: self.measured[c])
+        rates = [self.fps(c, pixels, bandwidth, fpsLimit) for c in self.candidates]
+        best = max(rates)
+        for c,r in zip(self.candidates, rates):
+            if r >= (1.0 - self.tolerance)*best:
+                return c
+
+    def reset(self):
+        self.costs, self.measured = {}, {}
+        self.overhead = None
@@ -0,0 +1,222 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#One render loop for all the async PVDisplays of a kernel
+import asyncio
+import concurrent.futures
+import threading
+import time
+import traceback
+
+__all__ = ['RenderScheduler']
+
+class _Entry:
+    #a display's place in the schedule, with its scheduling stats
+    def __init__(self, display):
+        self.display = display
+        self.dueSince = None #time.time() a frame was first seen due
+        self.task = None #the frame being rendered for the display, if any
+        self.frames = 0 #frames rendered
+        self.interactiveFrames = 0 #of those, rendered ahead for interaction
+        self.ahead = False #True if picked for interaction over others due
+        self.deferred = 0 #times a frame was due, but another view went first
+        self.renderTime = 0.0 #s spent on the render thread
+
+    def stats(self):
+        return {'frames': self.frames, 'interactiveFrames': self.interactiveFrames,
+                'deferred': self.deferred, 'renderTime': self.renderTime}
+
+class RenderScheduler:
+    """Renders the frames of all async PVDisplays on one event loop
+
+    There's one scheduler per event loop, running a single task that picks
+    the next display to render and renders it on the one render thread, so
+    displays never compete for the GIL or the render context. Displays say
+    when they next want a frame (see PVDisplay._frameDue), which accounts
+    for their own fpsLimit, frames in flight and visibility. Of the displays
+    due, those with interaction in the last `interactive` seconds go first,
+    then the one waiting the longest; a display waiting more than `starved`
+    seconds goes first regardless.
+    """
+    schedulers = {} #event loop: scheduler
+    lock = threading.Lock()
+    backgroundLoop = None #loop shared by the displays outside of a kernel
+
+    @classmethod
+    def forLoop(cls, loop=None):
+        """The scheduler of loop; without a (running) loop, the scheduler of
+        a loop on a thread of its own, shared by all displays without one
+        """
+        with cls.lock:
+            if loop is None or loop.is_closed():
+                if cls.backgroundLoop is None or cls.backgroundLoop.is_closed():
+                    cls.backgroundLoop = asyncio.new_event_loop()
+                    threading.Thread(target=cls.backgroundLoop.run_forever,
+                            daemon=True, name='PVDisplay-loop').start()
+                loop = cls.backgroundLoop
+            if loop not in cls.schedulers:
+                cls.schedulers[loop] = cls(loop)
+            return cls.schedulers[loop]
+
+    def __init__(self, loop, interactive=1.0, starved=1.0):
+        self.loop = loop
+        self.interactive = interactive
+        self.starved = starved
+        self.entries = {} #display: _Entry, in the order they were added
+        self.executor = concurrent.futures.ThreadPoolExecutor(1,
+                thread_name_prefix='PVDisplay-render')
+        self.event = None #asyncio.Event waking the schedule; made on the loop
+        self.task = None #the scheduling task, while there are displays
+
+    def add(self, display):
+        """Starts rendering display's frames; callable from any thread"""
+        self.__call(self.__add, display)
+
+    def remove(self, display):
+        """Stops rendering display's frames
+
+        From outside the event loop's thread, this waits for a frame of
+        display being rendered to be published. The scheduling task ends
+        with the last display.
+        """
+        if self.__onLoop():
+            self.entries.pop(display, None)
+            self.__wakeTask()
+            return
+        if self.loop.is_closed():
+            self.entries.pop(display, None)
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.__remove(display), self.loop).result()
+        except RuntimeError: #the loop is gone
+            self.entries.pop(display, None)
+
+    def wake(self):
+        """Reconsiders the schedule, e.g. after a display became dirty"""
+        if self.event is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.event.set)
+            except RuntimeError: #the loop is gone
+                pass
+
+    def stats(self, display=None):
+        """{'frames': n, ...} scheduling stats of display, or a list of
+        (display, stats) pairs for all displays without one
+        """
+        if display is not None:
+            entry = self.entries.get(display)
+            return entry.stats() if entry is not None else None
+        return [(d, e.stats()) for d,e in list(self.entries.items())]
+
+    def __onLoop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def __call(self, fn, *args):
+        if self.__onLoop():
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def __add(self, display):
+        if display not in self.entries:
+            self.entries[display] = _Entry(display)
+        if self.event is None:
+            self.event = asyncio.Event()
+        self.event.set()
+        if self.task is None:
+            self.task = self.loop.create_task(self.__run())
+
+    async def __remove(self, display):
+        entry = self.entries.pop(display, None)
+        self.__wakeTask()
+        if entry is not None and entry.task is not None:
+            await asyncio.shield(entry.task)
+
+    def __wakeTask(self):
+        #on the loop; the task rechecks its displays
+        if self.event is not None:
+            self.event.set()
+
+    def __pick(self, now):
+        #returns the entry to render next, or None and the seconds until one
+        #is due (None if only a wake() makes one due)
+        due, wait = [], None
+        for entry in list(self.entries.values()):
+            t = entry.display._frameDue()
+            if t is None or t > 0:
+                entry.dueSince = None
+                if t is not None and (wait is None or t < wait):
+                    wait = t
+                continue
+            if entry.dueSince is None:
+                entry.dueSince = now
+            due.append(entry)
+        if not due:
+            return None, wait
+
+        def priority(entry):
+            starved = now - entry.dueSince > self.starved
+            interacting = entry.display.quality.interacting(self.interactive)
+            return (not starved, not interacting, entry.dueSince)
+        due.sort(key=priority)
+        for entry in due[1:]:
+            entry.deferred += 1
+        first = due[0]
+        first.ahead = (len(due) > 1 and
+                first.display.quality.interacting(self.interactive))
+        return first, None
+
+    async def __run(self):
+        try:
+            while self.entries:
+                entry, wait = self.__pick(time.time())
+                if entry is None:
+                    #wakes that came in since the last pick are still set
+                    try:
+                        await asyncio.wait_for(self.event.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    self.event.clear()
+                    continue
+                entry.task = self.loop.create_task(self.__frame(entry))
+                try:
+                    await entry.task
+                finally:
+                    entry.task = None
+        finally:
+            self.task = None
+
+    async def __frame(self, entry):
+        display = entry.display
+        entry.dueSince = None
+        ts = time.perf_counter()
+        try:
+            encoded = await self.loop.run_in_executor(self.executor,
+                    display._renderScheduled)
+            display._publishScheduled(encoded)
+        except Exception:
+            #a display that fails to render drops back to sync mode rather
+            #than failing at its frame rate
+            traceback.print_exc()
+            self.entries.pop(display, None)
+            display.setAsync(False)
+            return
+        entry.renderTime += time.perf_counter() - ts
+        entry.frames += 1
+        entry.interactiveFrames += entry.ahead
@@ -0,0 +1,134 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Streaming writers for frame sequences, e.g. from PVDisplay.renderSequence.
+#Each writer encodes a frame as soon as it gets it, so no more than one frame
+#is ever held in memory.
+import struct
+from .frames import encodeFrame
+
+__all__ = ['MJPEGWriter', 'PNGSequenceWriter', 'WebPWriter', 'writeSequence']
+
+def writeSequence(frames, writer):
+    """Writes every frame from the iterable frames, then closes the writer
+
+    Returns the number of frames written.
+    """
+    n = 0
+    with writer:
+        for frame in frames:
+            writer.write(frame)
+            n += 1
+    return n
+
+class _FileWriter:
+    #base for writers producing a single file, given as a path or file object
+    def __init__(self, file):
+        self.owned = isinstance(file, str)
+        self.fp = open(file, 'wb') if self.owned else file
+        self.frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.owned:
+            self.fp.close()
+
+class MJPEGWriter(_FileWriter):
+    """Writes frames as a Motion JPEG stream of back-to-back JPEG images"""
+    def __init__(self, file, quality=90):
+        super(MJPEGWriter, self).__init__(file)
+        self.quality = quality
+
+    def write(self, frame):
+        self.fp.write(encodeFrame(frame, 'jpeg', self.quality))
+        self.frames += 1
+
+class PNGSequenceWriter:
+    """Writes each frame to its own PNG file, named pattern % frame number"""
+    def __init__(self, pattern='frame%05d.png'):
+        self.pattern = pattern
+        self.frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, frame):
+        with open(self.pattern % self.frames, 'wb') as fp:
+            fp.write(encodeFrame(frame, 'png'))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+def _chunk(fourcc, payload):
+    #a RIFF chunk, padded to an even size
+    return fourcc + struct.pack('<I', len(payload)) + payload + b'\0'*(len(payload) & 1)
+
+def _uint24(*vs):
+    return b''.join(struct.pack('<I', v)[:3] for v in vs)
+
+class WebPWriter(_FileWriter):
+    """Writes frames to an animated WebP file
+
+    PIL can only write animations from a list of all frames, so frames are
+    encoded as single WebP images, and their bitstream chunks are appended
+    to the file as animation frames as they come in. The RIFF size in the
+    header is patched on close(), so the file must be seekable.
+    """
+    def __init__(self, file, fps=30.0, quality=80, lossless=False, loop=0):
+        super(WebPWriter, self).__init__(file)
+        self.duration = int(round(1000.0/fps)) #ms per frame
+        self.quality, self.lossless, self.loop = quality, lossless, loop
+        self.start = self.fp.tell()
+        self.size = None
+
+    def write(self, frame):
+        h,w = frame.shape[:2]
+        if self.size is None:
+            self.size = (w,h)
+            self.fp.write(b'RIFF\0\0\0\0WEBP')
+            self.fp.write(_chunk(b'VP8X', b'\x02\0\0\0' + _uint24(w-1, h-1)))
+            self.fp.write(_chunk(b'ANIM', struct.pack('<IH', 0, self.loop)))
+
+        #keep the image chunks of the single frame file, skipping its header
+        img = encodeFrame(frame, 'webp', self.quality, lossless=self.lossless)
+        chunks, i = [], 12
+        while i < len(img):
+            fourcc, n = img[i:i+4], struct.unpack('<I', img[i+4:i+8])[0]
+            if fourcc in (b'ALPH', b'VP8 ', b'VP8L'):
+                chunks.append(img[i:i+8+n+(n & 1)])
+            i += 8 + n + (n & 1)
+
+        #frame at (0,0), full size, not blended with the previous frame
+        header = _uint24(0, 0, w-1, h-1, self.duration) + b'\x02'
+        self.fp.write(_chunk(b'ANMF', header + b''.join(chunks)))
+        self.frames += 1
+
+    def close(self):
+        if self.size is not None:
+            end = self.fp.tell()
+            self.fp.seek(self.start + 4)
+            self.fp.write(struct.pack('<I', end - self.start - 8))
+            self.fp.seek(end)
+        super(WebPWriter, self).close()
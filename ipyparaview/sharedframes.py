@@ -0,0 +1,169 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#Frames in shared memory, for a rank 0 actor on the same host as the kernel
+import collections
+from multiprocessing import shared_memory
+import numpy as np
+
+from .frames import FrameRing
+
+__all__ = ['SharedFrame', 'SharedFrameRing', 'SharedFrameReader']
+
+#what goes through Dask instead of the pixels: the slot the frame is in, its
+#sequence number, and the generation and (h,w,channels) shape of the ring
+SharedFrame = collections.namedtuple('SharedFrame', 'slot seq generation shape')
+
+def _attach(name):
+    #attaches to an existing segment without registering it with this
+    #process's resource tracker, which would unlink it from under its owner
+    #when this process exits. Before Python 3.13 there's no way to ask for
+    #that, so registration is switched off while attaching.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def _create(size, name=None):
+    return shared_memory.SharedMemory(name=name, create=True, size=max(1, size))
+
+def _release(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass #a frame handed out still maps it; it goes with that frame
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+class SharedFrameRing(FrameRing):
+    """A FrameRing whose buffers live in shared memory
+
+    Each slot is a segment of its own, named after the ring's control
+    segment and the generation of the buffers, which is bumped whenever the
+    frame shape changes. The control segment holds the sequence number of
+    the frame in each slot, 0 while a slot is being written, so that a
+    reader in another process can tell that a frame was overwritten.
+    """
+    def __init__(self, slots=4, channels=4):
+        super().__init__(slots, channels)
+        self.control = _create(8*slots)
+        self.name = self.control.name
+        self.seqs = np.ndarray((slots,), dtype=np.uint64, buffer=self.control.buf)
+        self.seqs[:] = 0
+        self.seq = 0
+        self.generation = 0
+        self.segments = []
+
+    def get(self, w, h):
+        buf = super().get(w, h)
+        self.seqs[self.slot] = 0 #being written
+        return buf
+
+    def _allocate(self, w, h):
+        self.__releaseSegments()
+        self.generation += 1
+        self.segments = [_create(h*w*self.channels, segmentName(self.name,
+            self.generation, i)) for i in range(self.slots)]
+        self.seqs[:] = 0
+        return [self._opaque(np.ndarray((h,w,self.channels), dtype=np.uint8,
+            buffer=s.buf)) for s in self.segments]
+
+    def publish(self):
+        """Marks the buffer get() returned last as written; returns its SharedFrame"""
+        self.seq += 1
+        self.seqs[self.slot] = self.seq
+        return SharedFrame(self.slot, self.seq, self.generation,
+                self.buffers[self.slot].shape)
+
+    def close(self):
+        self.buffers = []
+        self.__releaseSegments()
+        self.seqs = None
+        _release(self.control)
+
+    def __releaseSegments(self):
+        for s in self.segments:
+            _release(s)
+        self.segments = []
+
+def segmentName(name, generation, slot):
+    """The name of a slot's segment in the ring with control segment name"""
+    return '%s_%d_%d' % (name, generation, slot)
+
+class SharedFrameReader:
+    """Reads the frames of a SharedFrameRing in another process on the host
+
+    Attaching raises FileNotFoundError if the ring's segments aren't
+    visible here, i.e. if the ring is on another host (or container).
+    """
+    def __init__(self, name):
+        self.name = name
+        self.control = _attach(name)
+        self.seqs = np.ndarray((self.control.size//8,), dtype=np.uint64,
+                buffer=self.control.buf)
+        self.generation = None
+        self.slots = {} #slot: (segment, buffer) of the current generation
+        self.reads, self.misses = 0, 0
+
+    def read(self, frame):
+        """Returns a copy of frame, or None if it was overwritten already"""
+        if frame.generation != self.generation:
+            self.__detachSlots()
+            self.generation = frame.generation
+        try:
+            buf = self.__slot(frame)
+        except FileNotFoundError:
+            self.misses += 1
+            return None #the ring was reallocated since
+        #a slot that's overwritten while being copied has changed its
+        #sequence number by the end of the copy
+        if self.seqs[frame.slot] != frame.seq:
+            self.misses += 1
+            return None
+        out = buf.copy()
+        if self.seqs[frame.slot] != frame.seq:
+            self.misses += 1
+            return None
+        self.reads += 1
+        return out
+
+    def close(self):
+        self.__detachSlots()
+        self.seqs = None
+        self.control.close()
+
+    def __slot(self, frame):
+        if frame.slot not in self.slots:
+            shm = _attach(segmentName(self.name, frame.generation, frame.slot))
+            self.slots[frame.slot] = (shm, np.ndarray(frame.shape,
+                dtype=np.uint8, buffer=shm.buf))
+        return self.slots[frame.slot][1]
+
+    def __detachSlots(self):
+        #the buffers have to go before their segments can be closed
+        segments = [shm for shm,_ in self.slots.values()]
+        self.slots = {}
+        for shm in segments:
+            shm.close()
@@ -0,0 +1,181 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+#WebSocket frame server for VStream widgets. Frames go out as binary JPEG
+#messages and interaction events come back as the same JSON messages the
+#PVDisplay frontend sends over the comm, so neither direction goes through
+#the Jupyter comm.
+import json
+from urllib.parse import urlparse
+
+from tornado.ioloop import IOLoop
+from tornado.web import Application
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+
+__all__ = ['FrameServer']
+
+class _FrameSocket(WebSocketHandler):
+    def initialize(self, server):
+        self.server = server
+        self.sending = None #future of the frame being written, if any
+        self.pending = None #latest frame to write once that's done
+        self.dropped = 0 #frames skipped because this client was still busy
+
+    def check_origin(self, origin):
+        #the notebook page is served from another port than the frames, so
+        #tornado's same-origin check would refuse it; see FrameServer.origins
+        return self.server._allowedOrigin(origin, self.request.host_name)
+
+    def open(self):
+        self.server._connected(self)
+
+    def on_close(self):
+        self.server._disconnected(self)
+
+    def on_message(self, message):
+        try:
+            content = json.loads(message)
+        except ValueError:
+            return
+        #only interaction; the rest of the display's messages are about its
+        #own frontend. As for subscribers, latency isn't measured here.
+        if not isinstance(content, dict):
+            return
+        event = content.get('event')
+        if event in ('rotate', 'pan', 'zoom') and 'data' in content:
+            self.server.display._handle_custom_msg(dict(content, t=None), [])
+        elif event == 'updateCam':
+            self.server.display._handle_custom_msg({'event': event}, [])
+
+    def sendFrame(self, frame):
+        #a slow client gets the latest frame once it's done with the previous
+        #one, rather than a growing backlog
+        if self.sending is not None and not self.sending.done():
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = frame
+            return
+        try:
+            self.sending = self.write_message(frame, binary=True)
+        except WebSocketClosedError:
+            self.sending = self.pending = None
+            return
+        self.sending.add_done_callback(self.__sent)
+
+    def __sent(self, fut):
+        if fut.cancelled() or fut.exception() is not None:
+            self.pending = None #the connection is gone
+            return
+        frame, self.pending = self.pending, None
+        if frame is not None:
+            self.sendFrame(frame)
+
+class FrameServer:
+    """Serves a PVDisplay's frames to any number of VStream widgets
+
+    The server runs on the kernel's IOLoop (asyncio), and subscribes to the
+    display's encoded frames, which puts the display in compressed mode for
+    as long as the server runs. With bypassComm, the display stops sending
+    frames over its own comm while the server runs; interaction still works
+    from both.
+
+    Connections are only accepted from pages on the host the server is
+    reached at, whatever their port, or with origins, from the given page
+    origins ('http://host:port') only; '*' allows any page.
+
+    server = FrameServer(disp)
+    server.start()
+    server.widget() #a VStream connected to the server
+    """
+    def __init__(self, display, port=9002, host='localhost', bypassComm=True,
+            origins=None):
+        self.display = display
+        self.port, self.host = port, host
+        self.bypassComm = bypassComm
+        self.origins = origins #page origins allowed to connect; see above
+        self.clients = set()
+        self.latest = None #latest frame, for clients connecting in between
+        self.framesSent = 0
+        self.loop = None
+        self.httpServer = None
+
+    @property
+    def url(self):
+        return 'ws://%s:%d/' % (self.host, self.port)
+
+    @property
+    def running(self):
+        return self.httpServer is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.loop = IOLoop.current()
+        app = Application([(r'/', _FrameSocket, {'server': self})])
+        self.httpServer = app.listen(self.port, address=self.host)
+        self.display.addFrameListener(self.__onFrame)
+        if self.bypassComm:
+            self.display.commFrames = False
+        self.display.markDirty()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.display.removeFrameListener(self.__onFrame)
+        self.display.commFrames = True
+        self.httpServer.stop()
+        self.httpServer = None
+        for c in list(self.clients):
+            c.close()
+        self.clients.clear()
+        self.display.markDirty()
+
+    def widget(self, **kwargs):
+        """Returns a VStream widget connected to this server"""
+        from .widgets import VStream
+        v = VStream(url=self.url, **kwargs)
+        v.connect()
+        return v
+
+    def stats(self):
+        return {'clients': len(self.clients), 'framesSent': self.framesSent,
+                'dropped': sum(c.dropped for c in self.clients)}
+
+    def _allowedOrigin(self, origin, host):
+        #host is the one the client reached the server at
+        if self.origins is not None:
+            return '*' in self.origins or origin in self.origins
+        return urlparse(origin).hostname == host
+
+    def _connected(self, client):
+        self.clients.add(client)
+        if self.latest is not None:
+            client.sendFrame(self.latest)
+        else:
+            self.display.markDirty()
+
+    def _disconnected(self, client):
+        self.clients.discard(client)
+
+    def __onFrame(self, frame):
+        #called from whichever thread publishes the display's frames
+        self.loop.add_callback(self.__broadcast, frame)
+
+    def __broadcast(self, frame):
+        self.latest = frame
+        for c in list(self.clients):
+            c.sendFrame(frame)
+        self.framesSent += 1
@@ -16,17 +16,23 @@
 
 #Functions for handling camera interaction
 from .camera_models import *
+from .frames import (FrameRing, TileDiffer, encodeFrame, readFrame, resizeFrame,
+        compressFrame, CODECS, AUTO_CODECS, readDepth, packDepth, cameraState)
+from .quality import (InteractionQuality, ResolutionController,
+        BandwidthEstimator, CodecSelector)
+from .pipeline import FramePipeline, FrameWindow
+from .metrics import FrameMetrics, FrameTimer
+from .cache import FrameCache
+from .sharedframes import SharedFrame, SharedFrameReader
+from .scheduler import RenderScheduler
 
 import ipywidgets as widgets
-from traitlets import Unicode, Int, Float, Bytes, Tuple, validate
+from traitlets import Unicode, Int, Float, Bool, Tuple, Enum, validate, TraitError
 import time
 import numpy as np
 import threading
-
-# for jpeg / png transfer ("compress frames"):
-import base64
-from io import BytesIO
-from PIL import Image
+import contextlib
+import asyncio
 
 @widgets.register
 class PVDisplay(widgets.DOMWidget):
@@ -38,17 +44,42 @@ class PVDisplay(widgets.DOMWidget):
     _view_module_version = Unicode('^0.1.2').tag(sync=True)
     _model_module_version = Unicode('^0.1.2').tag(sync=True)
 
-    # traitlets -- variables synchronized with front end
-    frame = Bytes().tag(sync=True)
-    compressedFrame = Bytes().tag(sync=True)
+    # traitlets -- variables synchronized with front end. Frames aren't
+    # state; they go out as custom messages, see __commFrame
+    frameFormat = Enum(['rgba', 'rgb'], 'rgba').tag(sync=True) #raw pixel format
     resolution = Tuple((800,500)).tag(sync=True) #canvas resolution; w,h
     fpsLimit = Float(60.0).tag(sync=True) #maximum render rate
     maxEventRate = Float(20.0).tag(sync=True) #maximum number of mouse events/s
+    maxFramesInFlight = Int(2, min=0) #frames sent but not drawn yet; 0 for no limit
+
+    # progressive quality -- cheap frames while interacting, refined when idle
+    progressive = Bool(False) #enables the settings below
+    interactionQuality = Int(20) #JPEG quality of frames during interaction
+    interactionScale = Float(0.5) #resolution scale of frames during interaction
+    refineDelay = Float(0.25) #s without interaction before refining
+    refineQuality = Int(95) #JPEG quality of refined frames (compressed mode)
+
+    # codecs -- how compressed frames are encoded; see frames.CODECS
+    codec = Unicode('jpeg') #a registered codec, or 'auto' to pick by bandwidth
+    codecQuality = Int(50, min=1, max=100) #quality of lossy codecs
+
+    # adaptive resolution -- render smaller while interacting to hold targetFps
+    adaptiveResolution = Bool(False) #enables the settings below
+    targetFps = Float(15.0, min=0.1) #frame rate to hold while interacting
+    minResolutionScale = Float(0.25, min=0.01, max=1.0) #bounds of the scale
+    maxResolutionScale = Float(1.0, min=0.01, max=1.0)  #of the render size
+
+    @validate('codec')
+    def _validateCodec(self, proposal):
+        if proposal['value'] != 'auto' and proposal['value'] not in CODECS:
+            raise TraitError("codec must be 'auto' or one of %s" % sorted(CODECS))
+        return proposal['value']
 
     # class variables
     instances = dict()
     rotateScale = 5.0
     zoomScale = 0.05
+    phiLimit = 1.5175 #elevation limit of rotation, radians
 
     @classmethod
     def GetOrCreate(cls, ren, runAsync=True, **kwargs):
@@ -61,7 +92,10 @@ class PVDisplay(widgets.DOMWidget):
             cls.instances.update({ ren : instance })
         return instance
 
-    def __init__(self, ren, runAsync=True, compressFrames=False, **kwargs):
+    def __init__(self, ren, runAsync=True, compressFrames=False,
+            renderOnDemand=False, deltaFrames=False, tileSize=64,
+            pipelined=False, cacheBytes=0, depthFrames=False, depthStep=2,
+            sharedFrames=True, pvs=None, w2i=None, **kwargs):
         # see if we can import Dask.distributed, then try guessing the render
         # mode based on the type of ren. Fallback to regular Jupyter rendering
         # otherwise
@@ -83,15 +117,56 @@ class PVDisplay(widgets.DOMWidget):
         self.compressFrames = compressFrames
         self.pvs, self.renv, self.w2i = None,None,None #used for Jupyter kernel rendering
         self.master, self.renderers = None,[] #used for Dask rendering
+        self.cameraEvents = [] #Dask camera events not yet sent to the actors
+        self.pendingDeltas = {} #coalesced mouse deltas, by event type
+        self.coalescedEvents = 0 #events merged into an earlier pending one
+        self.syncScheduled = False #True if a sync mode render is scheduled
+        self.cameraLock = threading.Lock()
+        self.renderLock = threading.Lock() #serializes use of the render view
+        self.sequences = 0 #renderSequence generators holding the camera
+        self.closed = False #set under renderLock; no frames render after
         self.tp = time.time() #time of latest render
         self.fps = 10.0
         self.fpsOut = [] #FPS output ipywidgets; passed in from Jupyter
-        self.intyld = [0.05, 0.01] #interaction yield--period and duration
-        self.tiy = time.time() #time of last interaction yield
+        self.renderOnDemand = renderOnDemand #only render when the view is dirty
+        self.dirty = threading.Event() #set when the view needs a new frame
+        self.dirty.set()
+        self.dirtyTime = None #perf_counter time the view became dirty
+        self.skippedFrames = 0 #frames not rendered because the view was clean,
+                               #up to the latest render; see schedulingStats
+        self.pipelineObservers = [] #(object, tag) pairs of VTK observers
+        self.tiles = TileDiffer(tileSize) if deltaFrames else None #raw deltas
+        self.frameBytes = 0 #size of the latest frame update sent
+        self.quality = InteractionQuality()
+        self.previewShown = False #True if the frontend shows a preview frame
+        self.resolutionControl = ResolutionController()
+        self.renderSize = None #w,h set on the view; None if never adapted
+        self.frameListeners = [] #functions getting each JPEG frame; see stream.py
+        self.commFrames = True #False to stop sending frames over the comm
+        self.metrics = FrameMetrics() #per-stage timings and latency
+        self.pendingStamp = None #client time of the oldest pending event, ms
+        self.pendingLatest = None #client time of the newest pending event, ms
+        self.appliedStamp = None #client time of the newest event applied, ms
+        self.depthFrames = depthFrames #send depth and camera for reprojection
+        self.depthStep = depthStep #subsampling of the depth sent
+        self.sharedFrames = None #reader of the rank 0 actor's shared frames
+        self.cache = None #encoded frames by camera; Jupyter mode only
+        self.cameraThread = None #thread changing the view in __viewChange
+        self.subscribers = [] #PVDisplaySubscribers sharing this pipeline
+        self.sourceFrame = None #the frame read back for the current render
+        self.framesSent = 0 #frames sent over the comm; numbers them for acks
+        self.lastSent = None #(kind, bytes) of the latest frame sent
+        self.link = BandwidthEstimator() #bandwidth to the frontend, from acks
+        self.window = FrameWindow() #frames sent over the comm and not drawn yet
+        self.heldFrame = None #newest frame waiting for room in the window
+        self.framesReplaced = 0 #held frames replaced by newer ones
+        self.heldLock = threading.Lock()
+        self.codecs = CodecSelector([c for c in AUTO_CODECS if c[0] in CODECS])
 
         if self.mode == 'Dask':
             self.renderers = ren
-            self.master = [r for r in self.renderers if r.rank == 0][0]
+            self.masterIdx = [r.rank for r in self.renderers].index(0)
+            self.master = self.renderers[self.masterIdx]
             self.resolution = tuple(self.master.run(
                     lambda self : list(self.renv.ViewSize),
                     []).result())
@@ -103,8 +178,13 @@ class PVDisplay(widgets.DOMWidget):
                     []).result()
             self.camf = (cf[0], cf[1], cf[2])
             self.camp = (cp[0], cp[1], cp[2])
+            if sharedFrames:
+                self.sharedFrames = self.__shareFrames()
         else:
-            import paraview.simple as pvs
+            #pvs and w2i default to paraview.simple and a VTK window to image
+            #filter; benchmarks.mock has stand-ins that need neither
+            if pvs is None:
+                import paraview.simple as pvs
             self.pvs = pvs
             self.renv = ren
             self.resolution = tuple(self.renv.ViewSize)
@@ -114,32 +194,84 @@ class PVDisplay(widgets.DOMWidget):
             self.camf = (cf[0], cf[1], cf[2])
             self.camp = (cp[0], cp[1], cp[2])
 
-            import vtk
-            from vtk import vtkWindowToImageFilter
-            self.w2i = vtkWindowToImageFilter()
+            if w2i is None:
+                from vtk import vtkWindowToImageFilter
+                w2i = vtkWindowToImageFilter()
+            self.w2i = w2i
             self.w2i.ReadFrontBufferOff()
             self.w2i.ShouldRerenderOff()
             self.w2i.SetInput(self.renv.SMProxy.GetRenderWindow())
 
+            if cacheBytes:
+                self.cache = FrameCache(cacheBytes)
+            if renderOnDemand or self.cache is not None:
+                self.__observePipeline()
+
         self.frameNum = 0
         self.FRBufSz = 10
         self.FRBuf = np.zeros(self.FRBufSz, dtype=np.float32);
 
-        self.runAsync = runAsync
-        if runAsync:
-            self.renderThread = threading.Thread(target=self.__renderLoop)
-            self.renderThread.start()
-
-    #FIXME: starting the render loop thread outside of __init__ seems to create
-    # a copy of the paraview.simple object, rather than using the one that's
-    # part of the PVDisplay state; this causes PV to crash
-    #def setAsync(self, on):
-    #    if on and not self.runAsync:
-    #        self.runAsync = on
-    #        self.renderThread = threading.Thread(target=self.__renderLoop)
-    #        self.renderThread.start()
-    #    elif not on and self.runAsync:
-    #        self.runAsync = False
+        #the event loop frames are published on, and the render scheduler
+        #runs on in async mode; the kernel's, or a shared one outside a kernel
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+        self.scheduler = None #renders this display's frames in async mode
+        self.visibleViews = None #ids of frontend views on screen; None if unknown
+
+        #overlap encoding and publishing with rendering in async mode
+        self.pipeline = None
+        if runAsync and pipelined:
+            self.pipeline = FramePipeline(self.__encodeJob, self.__publishFromPipeline,
+                    dropped=self.__pipelineDropped)
+
+        #readback buffers; one per frame that can be in flight at once
+        slots = 1
+        if self.pipeline is not None:
+            slots = self.pipeline.depth + self.pipeline.workers + 1
+        self.frames = FrameRing(slots)
+
+        self.runAsync = False
+        self.setAsync(runAsync)
+
+    def setAsync(self, on):
+        """Start or stop asynchronous rendering
+
+        Frames are rendered by the RenderScheduler of the kernel's event
+        loop, which shares one render thread between all displays, and
+        published on the event loop. Stopping from outside the event loop's
+        thread waits for a frame being rendered to be published.
+        """
+        if on and not self.runAsync:
+            self.runAsync = True
+            self.__startLoop()
+        elif not on and self.runAsync:
+            self.runAsync = False
+            self.__stopLoop()
+
+    def close(self):
+        """Stop rendering and release the display's threads and observers"""
+        with self.renderLock:
+            #on the event loop, the scheduler may still be rendering a frame
+            #of ours; it finds us closed rather than torn down
+            self.closed = True
+        self.setAsync(False)
+        if self.pipeline is not None:
+            self.pipeline.close()
+        if self.sharedFrames is not None:
+            self.sharedFrames.close()
+            self.sharedFrames = None
+            self.master.unshareFrames().result()
+        for obj,tag in self.pipelineObservers:
+            obj.RemoveObserver(tag)
+        self.pipelineObservers = []
+        for sub in list(self.subscribers):
+            sub.close()
+        for ren,inst in list(PVDisplay.instances.items()):
+            if inst is self:
+                del PVDisplay.instances[ren]
+        super(PVDisplay, self).close()
 
     def addFPSDisplay(self, *w):
         """Add a widget to write FPS to"""
@@ -149,48 +281,254 @@ class PVDisplay(widgets.DOMWidget):
     def updateCam(self):
         self.render()
 
+    def addFrameListener(self, fn):
+        """Call fn(jpeg bytes) with every frame; forces compressed frames"""
+        self.frameListeners.append(fn)
+        self.markDirty()
+
+    def removeFrameListener(self, fn):
+        self.frameListeners.remove(fn)
+
+    def subscribe(self, resolution=None, quality=50, compressFrames=True, **kwargs):
+        """Returns another widget showing this display's frames
+
+        Subscribers share this display's render loop, camera and readback,
+        but get frames of their own resolution (defaulting to the view's)
+        and JPEG quality, or raw frames with compressFrames=False. Frames
+        are encoded once per distinct variant, however many subscribers
+        share it. Closing the subscriber unsubscribes it.
+        """
+        sub = PVDisplaySubscriber(self, tuple(resolution or self.resolution),
+                quality, compressFrames, **kwargs)
+        self.subscribers.append(sub)
+        self.markDirty()
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub in self.subscribers:
+            self.subscribers.remove(sub)
+
+    def markDirty(self):
+        """Flag the view as needing a new frame, waking the render scheduler"""
+        if not self.dirty.is_set():
+            self.dirtyTime = time.perf_counter()
+        self.dirty.set()
+        self.__wakeLoop()
+
+    def __wakeLoop(self):
+        if self.runAsync and self.scheduler is not None:
+            self.scheduler.wake()
+
+    def invalidateCache(self):
+        """Drop cached frames after changes the pipeline observer can't see
+
+        Property changes on ParaView proxies invalidate the cache by
+        themselves; changes made to VTK objects directly don't.
+        """
+        if self.cache is not None:
+            self.cache.invalidate()
+        self.markDirty()
+
     def render(self):
         if self.runAsync:
+            #the render scheduler picks this up; in continuous mode it's a no-op
+            self.markDirty()
             return
         else:
             tc = time.time()
             if(1.0/(tc-self.tp) < self.fpsLimit):
-                self.__renderFrame()
+                self.__renderNow()
 
 
     def fetchFrame(self):
+        """Returns the latest frame as a new (h,w,channels) uint8 array"""
+        channels = len(self.frameFormat)
         if self.mode == 'Dask':
-            return self.master.fetchFrame().result()
-        else:
-            # Mathias's magic frame fetching snippet
-            self.w2i.Modified()
-            self.w2i.Update()
-            imagedata = self.w2i.GetOutput()
-            w,h,_ = imagedata.GetDimensions()
-            from vtk.util.numpy_support import vtk_to_numpy
-            imagedata_np = vtk_to_numpy(
-                    imagedata.GetPointData().GetScalars()).reshape((h,w,3))
-            return np.flipud(np.pad(imagedata_np, ((0,0),(0,0),(0,1)),
-                mode='constant', constant_values=255))
+            return self.master.fetchFrame(channels).result()
+        #the render loop's buffers are only valid until its next readback
+        with self.renderLock:
+            return readFrame(self.w2i, FrameRing(1, channels))
+
+    def renderSequence(self, keyframes, nframes, channels=3):
+        """Renders nframes along a camera path through keyframes, one at a time
+
+        keyframes is a list of (position, focal point, view up) cameras, such
+        as the rows of camera_models.orbitCameraPath; the path between them
+        is computed with interpolateCameraPath. This is a generator of
+        (h,w,channels) uint8 frames, each only valid until the next one is
+        requested; pass it to sequence.writeSequence to encode a movie. In
+        Dask mode, the actors render each frame while the previous one is
+        being consumed. The display renders no frames of its own until the
+        sequence is done and the camera restored; interaction in the
+        meantime applies afterwards.
+        """
+        P,F,U = interpolateCameraPath(keyframes, nframes)
+        with self.__sequencing():
+            if self.mode == 'Dask':
+                yield from self.__actorSequence(P, F, U, channels)
+            else:
+                yield from self.__viewSequence(P, F, U, channels)
+
+    @contextlib.contextmanager
+    def __sequencing(self):
+        #keeps the display's own frames from moving the camera under a
+        #sequence; taking the lock waits for a frame being rendered
+        with self.renderLock:
+            self.sequences += 1
+        try:
+            yield
+        finally:
+            with self.renderLock:
+                self.sequences -= 1
+            self.render()
+
+    def __actorSequence(self, P, F, U, channels):
+        shared = self.sharedFrames is not None
+        def submit(events, **fetch):
+            #all ranks have to get their calls in the same order
+            with self.renderLock:
+                futs = [r.interact(events, **fetch) for r in self.renderers]
+            return futs[self.masterIdx]
+        cam = self.master.getCam().result()
+        try:
+            fut = submit([('camera', (P[0], F[0], U[0]))], channels=channels,
+                    shared=shared)
+            for i in range(1, len(P)+1):
+                frame = self.__sharedFrame(fut.result())
+                if i < len(P):
+                    fut = submit([('camera', (P[i], F[i], U[i]))],
+                            channels=channels, shared=shared)
+                yield frame
+        finally:
+            submit([('camera', cam)], wantFrame=False).result()
+
+    def __viewSequence(self, P, F, U, channels):
+        ring = FrameRing(1, channels) #the render loop has its own buffers
+        with self.renderLock:
+            cam = (list(self.renv.CameraPosition),
+                   list(self.renv.CameraFocalPoint),
+                   list(self.renv.CameraViewUp))
+        try:
+            for p,f,u in zip(P,F,U):
+                with self.renderLock:
+                    self.__setCamera((list(p), list(f), list(u)))
+                    self.pvs.Render(view=self.renv)
+                    frame = readFrame(self.w2i, ring)
+                yield frame
+        finally:
+            with self.renderLock:
+                self.__setCamera(cam)
 
     def _handle_custom_msg(self, content, buffers):
         self.content = content
         if content['event'] == 'updateCam':
             self.updateCam()
+        if content['event'] == 'keyframe':
+            #a new view; the frames in flight went to one that's gone
+            self.window.reset()
+            self.__requestKeyframe()
+        if content['event'] == 'decodeError':
+            #the frontend couldn't show frame n; it's done with it, but has
+            #no frame for the tiles after it to patch, held ones included
+            if self.tiles is not None:
+                self.tiles.reset()
+            if 'n' in content:
+                self.__frameAcked(content['n'])
+            self.__requestKeyframe()
+        if content['event'] == 'visibility':
+            self.__viewShown(content)
+        if content['event'] == 'frameDrawn':
+            if 'n' in content:
+                self.__frameAcked(content['n'])
+            if content.get('latency') is not None:
+                self.metrics.record({'latency': content['latency']/1000.0})
+            if content.get('decode') is not None:
+                self.metrics.record({'decode': content['decode']/1000.0})
+
+        if content['event'] in ('rotate', 'pan', 'zoom'):
+            self.quality.interact()
+            self.__scheduleRefine()
+            self.__coalesce(content['event'], content['data'], content.get('t'))
+            if self.runAsync:
+                self.markDirty()
+            else:
+                self.__scheduleSyncRender()
+
+    def __coalesce(self, event, data, t=None):
+        #merges an event into the deltas pending for the next frame. Rotate
+        #and pan deltas add up; zoom deltas are exponents of the zoom factor,
+        #so adding them multiplies the factors. t is the client's timestamp.
+        with self.cameraLock:
+            if t is not None and (self.pendingStamp is None or t < self.pendingStamp):
+                self.pendingStamp = t
+            if t is not None and (self.pendingLatest is None or t > self.pendingLatest):
+                self.pendingLatest = t
+            self.coalescedEvents += event in self.pendingDeltas
+            if event == 'zoom':
+                self.pendingDeltas['zoom'] = self.pendingDeltas.get('zoom', 0.0) + data
+            else:
+                d = self.pendingDeltas.setdefault(event, {'x': 0.0, 'y': 0.0})
+                d['x'] += data['x']
+                d['y'] += data['y']
+
+    def __applyCameraEvents(self):
+        #applies the coalesced deltas as one camera update per event type;
+        #returns the client timestamp of the oldest event, if any
+        with self.cameraLock:
+            pending, self.pendingDeltas = self.pendingDeltas, {}
+            stamp, self.pendingStamp = self.pendingStamp, None
+            latest, self.pendingLatest = self.pendingLatest, None
+            if latest is not None:
+                self.appliedStamp = latest
+        with self.__viewChange():
+            if 'rotate' in pending:
+                self.__rotateCam(pending['rotate'])
+            if 'pan' in pending:
+                self.__panCam(pending['pan'])
+            if 'zoom' in pending:
+                self.__zoomCam(pending['zoom'])
+        return stamp
 
-        if content['event'] == 'rotate':
-            self.__rotateCam(content['data'])
-        if content['event'] == 'pan':
-            self.__panCam(content['data'])
-        if content['event'] == 'zoom':
-            self.__zoomCam(content['data'])
+    @contextlib.contextmanager
+    def __viewChange(self):
+        #camera and view size changes made by the display itself are part
+        #of the cache key, so they don't invalidate the cache
+        self.cameraThread = threading.get_ident()
+        try:
+            yield
+        finally:
+            self.cameraThread = None
+
+    def __setCamera(self, cam):
+        #moves the camera to (position, focal point, view up)
+        with self.__viewChange():
+            (self.renv.CameraPosition,
+             self.renv.CameraFocalPoint,
+             self.renv.CameraViewUp) = cam
+
+    def __scheduleSyncRender(self):
+        #render from the kernel's IOLoop after the comm messages already
+        #queued are handled, so that a backlog of events becomes one frame
+        if not self.syncScheduled:
+            self.syncScheduled = True
+            from tornado.ioloop import IOLoop
+            IOLoop.current().add_callback(self.__syncRender)
+
+    def __syncRender(self):
+        #keep to fpsLimit by deferring the frame rather than dropping it
+        wait = 1.0/self.fpsLimit - (time.time() - self.tp)
+        if wait > 0:
+            from tornado.ioloop import IOLoop
+            IOLoop.current().call_later(wait, self.__syncRender)
+            return
+        self.syncScheduled = False
+        self.__renderNow()
 
     def __rotateCam(self, mouseDelta):
         #rotates the camera around the focus in spherical
-        phiLim = 1.5175
+        phiLim = self.phiLimit
         if self.mode == 'Dask':
-            from dask.distributed import wait
-            wait([r.rotateCam(mouseDelta,self.rotateScale,phiLim) for r in self.renderers])
+            self.__queueCameraEvent('rotate', (mouseDelta,self.rotateScale,phiLim))
         else:
             (self.renv.CameraPosition,
              self.renv.CameraFocalPoint,
@@ -202,13 +540,10 @@ class PVDisplay(widgets.DOMWidget):
                      self.rotateScale,
                      phiLim)
 
-        self.render()
-        
     def __panCam(self, mouseDelta):
         #moves the camera with a 1:1 relation to current focal point
         if self.mode == 'Dask':
-            from dask.distributed import wait
-            wait([r.panCam(mouseDelta) for r in self.renderers])
+            self.__queueCameraEvent('pan', (mouseDelta,))
         else:
             (self.renv.CameraPosition,
              self.renv.CameraFocalPoint,
@@ -219,15 +554,12 @@ class PVDisplay(widgets.DOMWidget):
                      self.renv.CameraViewUp,
                      self.renv.CameraViewAngle)
 
-        self.render()
-
     def __zoomCam(self, mouseDelta):
         #zooms by scaling the distance between camera and focus
         rlim = 0.00001 #minimum allowable radius
         d = (1.0+self.zoomScale)**mouseDelta
         if self.mode == 'Dask':
-            from dask.distributed import wait
-            wait([r.zoomCam(d,rlim) for r in self.renderers])
+            self.__queueCameraEvent('zoom', (d,rlim))
         else:
             (self.renv.CameraPosition,
              self.renv.CameraFocalPoint,
@@ -238,49 +570,570 @@ class PVDisplay(widgets.DOMWidget):
                      self.renv.CameraViewUp,
                      rlim)
 
+    def __refining(self):
+        #True if a full quality frame has to follow interaction
+        return self.progressive or self.adaptiveResolution
+
+    def __scheduleRefine(self):
+        #the async loop wakes up for refinement by itself; in sync mode there's
+        #nothing to render the refined frame, so ask the kernel's IOLoop to
+        if self.__refining() and not self.runAsync:
+            from tornado.ioloop import IOLoop
+            IOLoop.current().call_later(self.refineDelay, self.__refine)
+
+    def __refine(self):
+        if self.quality.refineIn(self.refineDelay) == 0.0:
+            self.__renderNow()
+
+    def __queueCameraEvent(self, name, args):
+        #camera events go to the actors along with the next render request
+        with self.cameraLock:
+            self.cameraEvents.append((name, args))
+
+    def __interact(self, **fetch):
+        #sends the pending camera events to all ranks, renders and reads back
+        #the frame in a single round trip; returns the future for rank 0's
+        #frame, which also means the other ranks are done compositing
+        with self.cameraLock:
+            events, self.cameraEvents = self.cameraEvents, []
+        if self.depthFrames:
+            fetch['depth'] = {'step': self.depthStep}
+        futs = [r.interact(events, timed=True, **fetch) for r in self.renderers]
+        return futs[self.masterIdx]
+
+    def __shareFrames(self):
+        #raw frames skip the network if the rank 0 actor is on this host,
+        #which is the case if its shared memory is visible here; returns the
+        #reader, or None to keep to the network
+        try:
+            name = self.master.shareFrames().result()
+        except Exception:
+            return None #no shared memory for the actor
+        try:
+            return SharedFrameReader(name)
+        except OSError:
+            self.master.unshareFrames().result()
+            return None
+
+    def __sharedFrame(self, result):
+        #the frame of an actor result that may be a SharedFrame; one that was
+        #overwritten before it could be copied is read back again over the
+        #network
+        if not isinstance(result, SharedFrame):
+            return result
+        frame = self.sharedFrames.read(result)
+        if frame is None:
+            frame = self.master.fetchFrame(result.shape[2]).result()
+        return frame
+
+    def __actorResult(self, fut, timer):
+        #waits for an __interact future, keeping the actor's stage timings,
+        #depth and camera
+        result, timings = fut.result()
+        timer.stages.update(timings)
+        if self.depthFrames:
+            result, timer.depth, timer.camera = result
+        return result
+
+    def __rawFrame(self, timer):
+        #renders and reads back once per frame, however many jobs need it
+        if self.sourceFrame is None:
+            self.sourceFrame = self.__fetchFrame(timer)
+        return self.sourceFrame
+
+    def __fetchFrame(self, timer):
+        if self.mode == 'Dask':
+            fut = self.__interact(channels=len(self.frameFormat),
+                    shared=self.sharedFrames is not None)
+            return self.__sharedFrame(self.__actorResult(fut, timer))
+        self.__renderView(timer)
+        self.frames.channels = len(self.frameFormat)
+        frame = readFrame(self.w2i, self.frames)
+        if self.depthFrames:
+            timer.lap('readback')
+            timer.depth = packDepth(readDepth(self.w2i), self.depthStep)
+            timer.camera = cameraState(self.renv)
+            timer.lap('depth')
+        return frame
+
+    def __renderView(self, timer):
+        #Jupyter mode renders just before readback, so that a cached frame
+        #needs no render at all
+        self.pvs.Render(view=self.renv)
+        timer.lap('render')
+
+    def __compressedJob(self, timer, codec, quality, step=1):
+        #returns a function computing the encoded frame. Dask actors encode
+        #on the worker, so only encoded bytes cross the network; the result
+        #is waited for here, so that the render stage has at most one actor
+        #call outstanding however far the pipeline's encoders lag. The
+        #returned function just hands it over. Subscribers need the raw
+        #frame anyway, so with those, it's encoded here instead.
+        if self.mode == 'Dask' and not self.subscribers:
+            fut = self.__interact(encode={'codec': codec,
+                'quality': quality, 'step': step})
+            encoded = self.__actorResult(fut, timer)
+            return lambda: encoded
+        frame = self.__rawFrame(timer)
+        return lambda: compressFrame(frame[::step, ::step], codec, quality)
+
+    def __pickCodec(self, timer):
+        #the codec and quality of the next full compressed frame
+        quality = self.refineQuality if self.progressive else self.codecQuality
+        if self.frameListeners:
+            return 'jpeg', quality #the listeners take JPEG
+        if self.codec != 'auto':
+            return self.codec, quality
+        w,h = timer.size or self.resolution
+        return self.codecs.choose(w*h, self.link.bandwidth(), self.fpsLimit)
+
+    def __requestKeyframe(self):
+        #a new view has no frame yet, and none to patch tiles into
+        if self.tiles is not None:
+            self.tiles.reset()
+        self.lastSent = None
         self.render()
 
-    def __compressFrame(self, frame):
-        img = Image.fromarray(frame[:,:,:3])
-        bytesIO = BytesIO()
-        img.save(bytesIO, format='jpeg', quality=50)
-        img_str = base64.b64encode(bytesIO.getvalue())
-        return img_str
+    def __frameJob(self, timer):
+        #fetches the latest frame and decides how it's sent, returning (kind
+        #of frame, function computing the frame bytes, force) or None if
+        #there's nothing to send. This is stateful, so it runs in frame
+        #order; the function can run anywhere.
+        interacting = self.quality.interacting(self.refineDelay)
+        if self.progressive and interacting:
+            step = max(1, int(round(1.0/self.interactionScale)))
+            q = self.interactionQuality
+            self.previewShown = True
+            timer.codec = ('jpeg', q, step)
+            return self.__cachedJob('compressed', ('jpeg', q, step), False,
+                    lambda: self.__compressedJob(timer, 'jpeg', q, step))
+
+        if not interacting:
+            self.quality.refined()
+        force, self.previewShown = self.previewShown, False
+        if self.compressFrames or self.frameListeners:
+            codec, q = self.__pickCodec(timer)
+            timer.codec = (codec, q, 1)
+            return self.__cachedJob('compressed', (codec, q, 1), force,
+                    lambda: self.__compressedJob(timer, codec, q))
+
+        if self.tiles is not None:
+            #tiles depend on the previous frame, so they can't be cached
+            frame = self.__rawFrame(timer)
+            tiles = self.tiles.diff(frame)
+            if not (tiles or force):
+                return None
+            timer.tiles = self.tiles.diffGeneration
+            return ('tiles', lambda: TileDiffer.pack(frame, tiles), force)
+        else:
+            return self.__cachedJob('raw', ('raw', len(self.frameFormat)), force,
+                    lambda: self.__rawFrame(timer).tobytes)
+
+    def __subscriberJobs(self, timer):
+        #one (subscribers, function computing their frame) per variant
+        variants = {}
+        for sub in list(self.subscribers):
+            variants.setdefault(sub.variant(), []).append(sub)
+        jobs = []
+        for variant,subs in variants.items():
+            _,encode,_ = self.__cachedJob(None, ('sub',) + variant, False,
+                    lambda: self.__variantJob(timer, *variant))
+            jobs.append((subs, encode))
+        return jobs
+
+    def __variantJob(self, timer, compressed, size, quality):
+        #returns a function computing a subscriber's frame
+        frame = self.__rawFrame(timer)
+        if compressed:
+            return lambda: encodeFrame(resizeFrame(frame, size), 'jpeg', quality)
+        return lambda: np.ascontiguousarray(resizeFrame(frame, size)).tobytes()
+
+    def __cachedJob(self, name, variant, force, build):
+        #returns the job for a frame of the given variant, from the cache if
+        #it has one for the current camera. build() renders and returns the
+        #function computing the frame bytes. Depth isn't cached, so depth
+        #frames are always rendered.
+        if self.cache is None or self.depthFrames:
+            return (name, build(), force)
+        key = self.cache.key(self.renv.CameraPosition, self.renv.CameraFocalPoint,
+                self.renv.CameraViewUp, self.renv.CameraViewAngle,
+                self.renv.ViewSize, variant)
+        value = self.cache.get(key)
+        if value is not None:
+            return (name, lambda: value, force)
+        encode = build()
+        def encodeAndCache():
+            value = encode()
+            self.cache.put(key, value)
+            return value
+        return (name, encodeAndCache, force)
+
+    def __encodeJob(self, job):
+        name, encode, force, timer, fanout = job
+        ts = time.perf_counter()
+        value = encode() if encode is not None else None
+        fanout = [(subs, enc()) for subs,enc in fanout]
+        timer.stages['encode'] = time.perf_counter() - ts
+        return (name, value, force, timer, fanout)
+
+    def __publishJob(self, encoded):
+        if self.closed:
+            return #rendered before close(); the comm may be gone
+        name, value, force, timer, fanout = encoded
+        ts = time.perf_counter()
+        for subs,v in fanout:
+            for sub in subs:
+                sub._setFrame(v)
+        if name is not None:
+            self.__publishFrame(name, value, force, timer)
+        timer.stages['publish'] = time.perf_counter() - ts
+        self.__recordFrame(timer)
+
+    def __publishFrame(self, name, value, force, timer):
+        if self.__staleTiles(name, timer):
+            return
+        if name == 'compressed':
+            for fn in list(self.frameListeners):
+                fn(value)
+        if self.commFrames:
+            #the frame goes out once the frontend has room for it
+            self.__holdFrame((name, value, force, timer))
+            self.__sendHeldFrame()
+        else:
+            self.frameBytes = len(value)
+
+    def __staleTiles(self, name, timer):
+        #True for tiles diffed against frames dropped since; the differ was
+        #reset for those, so a full frame follows
+        return name == 'tiles' and timer.tiles != self.tiles.generation
+
+    def __holdFrame(self, frame):
+        #keeps frame until the window has room, replacing an older one
+        with self.heldLock:
+            held, self.heldFrame = self.heldFrame, frame
+            if held is None:
+                return
+            self.framesReplaced += 1
+            if 'tiles' in (held[0], frame[0]):
+                #tiles patch the frame before them, so neither can go
+                #without the other; a full frame replaces both
+                self.heldFrame = None
+                self.tiles.reset()
+        if self.heldFrame is None:
+            self.markDirty()
+
+    def __sendHeldFrame(self):
+        with self.heldLock:
+            if self.heldFrame is None or self.window.full(self.maxFramesInFlight):
+                return
+            frame, self.heldFrame = self.heldFrame, None
+        if not self.__staleTiles(frame[0], frame[3]):
+            self.__commFrame(*frame)
+
+    def __commFrame(self, name, value, force, timer):
+        #sends a frame as a custom message with the frame bytes as its only
+        #buffer, so that the frame isn't kept in the widget state. An
+        #unchanged frame isn't sent again unless forced, which the frontend
+        #needs to switch back from a preview frame. The frontend
+        #acknowledges the frame number once it has drawn the frame, along
+        #with the latency if the frame has a stamp.
+        if not force and self.lastSent == (name, value):
+            return
+        self.lastSent = (name, value)
+        self.framesSent += 1
+        msg = {'event': 'frame', 'kind': name, 'n': self.framesSent}
+        if name == 'raw':
+            msg['size'] = timer.size or self.resolution #raw frames don't say
+        elif name == 'compressed':
+            msg['codec'] = timer.codec[0]
+        if timer.stamp is not None:
+            msg['t'] = timer.stamp
+        buffers = [value]
+        if timer.depth is not None:
+            #for the frontend to reproject the frame while the next one
+            #renders: the depth goes as a second buffer, and the frontend
+            #predicts the camera from the events after the applied one
+            msg['camera'] = timer.camera
+            msg['applied'] = timer.applied
+            msg['turntable'] = {'rotateScale': self.rotateScale,
+                    'phiLimit': self.phiLimit, 'zoomScale': self.zoomScale}
+            buffers.append(timer.depth)
+        self.send(msg, buffers)
+        self.frameBytes = sum(len(b) for b in buffers)
+        self.link.sent(self.framesSent, self.frameBytes)
+        self.window.sent(self.framesSent)
+        self.metrics.record({'inFlight': self.window.inFlight()})
+
+    def __frameAcked(self, n):
+        self.link.acked(n)
+        rtt = self.window.acked(n)
+        if rtt is not None:
+            self.metrics.record({'rtt': rtt})
+        self.__sendHeldFrame()
+        self.__wakeLoop() #the scheduler may be waiting for room
+
+    def __recordFrame(self, timer):
+        timer.stages['frame'] = timer.total()
+        self.metrics.record(timer.stages)
+        st = timer.stages
+        if not ('render' in st or 'actorRender' in st): #a cached frame
+            return
+        if timer.size is not None:
+            cost = sum(st.get(k, 0.0) for k in ('render', 'readback', 'encode'))
+            self.resolutionControl.update(cost, timer.scale)
+        if timer.codec is not None and timer.codec[2] == 1:
+            #Dask actors encode while the display waits in 'encode'
+            w,h = timer.size or self.resolution
+            encode = st.get('actorEncode', st.get('encode', 0.0))
+            self.codecs.update(timer.codec[:2], w*h, encode, self.frameBytes,
+                    st['frame'] - encode - st.get('publish', 0.0))
+
+    def __applyResolution(self, timer):
+        #sizes the view for this frame: scaled down to hold targetFps while
+        #interacting, full resolution otherwise
+        if not self.adaptiveResolution and self.renderSize is None:
+            return
+        scale = 1.0
+        if self.adaptiveResolution and self.quality.interacting(self.refineDelay):
+            scale = self.resolutionControl.scale(self.targetFps,
+                    self.minResolutionScale, self.maxResolutionScale)
+        w,h = self.resolution
+        size = (max(1, int(round(w*scale))), max(1, int(round(h*scale))))
+        if size != self.renderSize:
+            self.renderSize = size
+            if self.mode == 'Dask':
+                self.__queueCameraEvent('viewSize', size)
+            else:
+                with self.__viewChange():
+                    self.renv.ViewSize = list(size)
+        timer.size, timer.scale = size, scale
+
+    def __sendFrame(self, timer):
+        job = self.__frameJob(timer)
+        fanout = self.__subscriberJobs(timer) if self.subscribers else []
+        self.sourceFrame = None
+        timer.lap('readback')
+        if job is None:
+            self.frameBytes = 0
+            if not fanout:
+                self.__recordFrame(timer)
+                return
+            job = (None, None, False)
+        job += (timer, fanout)
+        if self.pipeline is not None:
+            self.pipeline.submit(job)
+            return None
+        return self.__encodeJob(job)
+
+    def __publishFromPipeline(self, encoded):
+        #the pipeline's publisher thread hands frames to the event loop
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.__publishJob, encoded)
+        else:
+            self.__publishJob(encoded)
+
+    def __pipelineDropped(self, job):
+        #tiles patch the frame before them, so the frontend can't skip any;
+        #as in __holdFrame, a full frame replaces the ones in flight, which
+        #__publishFrame tells by their generation
+        if job[0] == 'tiles':
+            self.tiles.reset()
+            self.markDirty()
 
     def __renderFrame(self):
+        #renders, returning the encoded frame for the caller to publish, or
+        #None if there's nothing to publish or the pipeline publishes it
+        with self.renderLock:
+            if self.closed:
+                return None
+            if self.sequences:
+                return None #renderSequence renders it once it's done
+            return self.__renderFrameLocked()
+
+    def __renderNow(self):
+        #renders and publishes on the calling thread, for sync mode
+        encoded = self.__renderFrame()
+        if encoded is not None:
+            self.__publishJob(encoded)
+        self.__showFps()
+
+    def __showFps(self):
+        for fo in self.fpsOut:
+            fo.value = self.fps
+
+    def __renderFrameLocked(self):
         tc = time.time()
         self.FRBuf[self.frameNum % self.FRBufSz] = 1.0/(tc - self.tp)
         self.tp = tc
 
-        #set the camera position, render, and get the output frame
-        if self.mode == 'Dask':
-            from dask.distributed import wait
-            wait([r.render() for r in self.renderers])
-        else:
-            self.pvs.Render(view=self.renv)
-        uncompressedFrameNp = self.fetchFrame()
-        if self.compressFrames:
-            self.compressedFrame = self.__compressFrame(uncompressedFrameNp)
-        else:
-            self.frame = uncompressedFrameNp.tostring()
+        #set the camera position, then render and get the output frame when
+        #__frameJob asks for it
+        timer = FrameTimer()
+        dirtyTime, self.dirtyTime = self.dirtyTime, None
+        if dirtyTime is not None:
+            timer.stages['wake'] = timer.start - dirtyTime
+        self.__applyResolution(timer)
+        timer.stamp = self.__applyCameraEvents()
+        timer.applied = self.appliedStamp
+        timer.lap('camera')
+        encoded = self.__sendFrame(timer)
         self.frameNum += 1
         self.fps = np.average(self.FRBuf)
-        if self.fpsOut is not None:
-            for fo in self.fpsOut:
-                fo.value = self.fps
+        return encoded
+
+    def __observePipeline(self):
+        #any property change on a registered proxy (filters, displays, views)
+        #may change the rendered image, so wake the render scheduler for it
+        pxm = self.pvs.servermanager.ProxyManager().SMProxyManager
+        tag = pxm.AddObserver('PropertyModifiedEvent',
+                lambda obj, evt: self.__pipelineModified())
+        self.pipelineObservers.append((pxm, tag))
+
+    def __pipelineModified(self):
+        #observers run on the thread making the change, so camera moves
+        #made by this display are told apart from everything else
+        if self.cache is not None and self.cameraThread != threading.get_ident():
+            self.cache.invalidate()
+        self.markDirty()
+
+    def __startLoop(self):
+        self.scheduler = RenderScheduler.forLoop(self.loop)
+        self.loop = self.scheduler.loop
+        self.scheduler.add(self)
+
+    def __stopLoop(self):
+        if self.scheduler is not None:
+            self.scheduler.remove(self)
+
+    def schedulingStats(self):
+        """This display's stats from the render scheduler, or None in sync mode
+
+        Besides frames rendered, those rendered ahead of other displays for
+        interaction, times deferred for another display and seconds of
+        render thread time, this has whether the frontend is on screen and
+        the frames skipped while the view was clean (renderOnDemand), up to
+        now.
+        """
+        stats = self.scheduler.stats(self) if self.scheduler is not None else None
+        if stats is not None:
+            skipped = self.skippedFrames
+            if self.renderOnDemand and not self.dirty.is_set():
+                skipped += self.__cleanFrames()
+            stats.update(visible=self.__visible(), skippedFrames=skipped)
+        return stats
+
+    def __cleanFrames(self):
+        #the frames we would have rendered at fpsLimit since the latest one
+        return max(0, int((time.time() - self.tp)*self.fpsLimit) - 1)
+
+    def _frameDue(self):
+        #for the scheduler: 0 if a frame is due now, otherwise the seconds
+        #until one is, or None if only an event (the view becoming dirty or
+        #visible, an ack, the end of a renderSequence) makes one due
+        if not self.__visible() or self.sequences:
+            return None
+        if self.commFrames and self.window.full(self.maxFramesInFlight):
+            return self.window.timeout #lost frames time out of the window
+        if self.renderOnDemand and not self.dirty.is_set():
+            refine = (self.quality.refineIn(self.refineDelay)
+                    if self.__refining() else None)
+            if refine is None or refine > 0:
+                return refine
+        return max(0.0, 1.0/self.fpsLimit - (time.time() - self.tp))
+
+    def _renderScheduled(self):
+        #renders a frame the scheduler picked, on its render thread
+        if self.renderOnDemand:
+            self.skippedFrames += self.__cleanFrames()
+        self.dirty.clear()
+        return self.__renderFrame()
+
+    def _publishScheduled(self, encoded):
+        #publishes what _renderScheduled returned, on the event loop
+        if encoded is not None:
+            self.__publishJob(encoded)
+        self.__showFps()
+
+    def __visible(self):
+        #frames are wanted if a view of this display or a subscriber is on
+        #screen, or for the frame listeners
+        return (_onScreen(self.visibleViews) or bool(self.frameListeners) or
+                any(_onScreen(sub.visibleViews) for sub in self.subscribers))
+
+    def __viewShown(self, content):
+        #a frontend view reports going on or off screen
+        wasVisible = self.__visible()
+        self.visibleViews = _viewShown(self.visibleViews, content)
+        if self.__visible() and not wasVisible:
+            self.markDirty() #the frontend shows a stale frame
+
+def _onScreen(views):
+    #views is None until a frontend view reports; old frontends never do
+    return views is None or len(views) > 0
 
+def _viewShown(views, content):
+    #the ids of the views on screen, after a visibility message
+    views = set() if views is None else set(views)
+    if content.get('visible'):
+        views.add(content.get('view'))
+    else:
+        views.discard(content.get('view'))
+    return views
 
-    def __renderLoop(self):
-        while self.runAsync:
-            #check if it's time for an interaction yield; if so, do it
-            if time.time() - self.tiy > self.intyld[0]:
-                time.sleep(self.intyld[1])
-                self.tiy = time.time()
+@widgets.register
+class PVDisplaySubscriber(widgets.DOMWidget):
+    """Another widget showing a PVDisplay's frames; see PVDisplay.subscribe"""
+    _view_name = Unicode('PVDisplayView').tag(sync=True)
+    _model_name = Unicode('PVDisplayModel').tag(sync=True)
+    _view_module = Unicode('ipyparaview').tag(sync=True)
+    _model_module = Unicode('ipyparaview').tag(sync=True)
+    _view_module_version = Unicode('^0.1.2').tag(sync=True)
+    _model_module_version = Unicode('^0.1.2').tag(sync=True)
+
+    # the traits of PVDisplay the frontend uses
+    resolution = Tuple((800,500)).tag(sync=True)
+    maxEventRate = Float(20.0).tag(sync=True)
 
-            #sleep to keep FPS to fpsLimit
-            time.sleep(max(0, 1.0/self.fpsLimit - (time.time() - self.tp)))
+    def __init__(self, display, resolution, quality=50, compressFrames=True, **kwargs):
+        super(PVDisplaySubscriber, self).__init__(resolution=resolution,
+                maxEventRate=display.maxEventRate, **kwargs)
+        self.display = display
+        self.quality = quality
+        self.compressFrames = compressFrames
+        self.frameBytes = 0 #size of the latest frame update sent
+        self.visibleViews = None #ids of frontend views on screen; None if unknown
+
+    def variant(self):
+        #subscribers with equal variants share one encoded frame
+        return (self.compressFrames, tuple(self.resolution),
+                self.quality if self.compressFrames else None)
+
+    def _setFrame(self, value):
+        #frames go out like the display's, unnumbered since nothing waits
+        #for their acknowledgement
+        if self.compressFrames:
+            msg = {'event': 'frame', 'kind': 'compressed', 'codec': 'jpeg'}
+        else:
+            msg = {'event': 'frame', 'kind': 'raw', 'size': self.resolution}
+        self.send(msg, [value])
+        self.frameBytes = len(value)
+
+    def _handle_custom_msg(self, content, buffers):
+        #the camera is shared, so interaction goes to the display; latency
+        #is only measured on the display's own frontend
+        if content['event'] in ('rotate', 'pan', 'zoom', 'updateCam'):
+            self.display._handle_custom_msg(dict(content, t=None), buffers)
+        elif content['event'] == 'keyframe':
+            self.display.markDirty()
+        elif content['event'] == 'visibility':
+            shown = not _onScreen(self.visibleViews)
+            self.visibleViews = _viewShown(self.visibleViews, content)
+            if shown and _onScreen(self.visibleViews):
+                self.display.markDirty()
 
-            self.__renderFrame()
+    def close(self):
+        self.display.unsubscribe(self)
+        super(PVDisplaySubscriber, self).close()
 
 @widgets.register
 class VStream(widgets.DOMWidget):
@@ -294,6 +1147,7 @@ class VStream(widgets.DOMWidget):
     _model_module_version = Unicode('^0.1.2').tag(sync=True)
     url = Unicode('ws://localhost:9002').tag(sync=True)
     state = Unicode('').tag(sync=True)
+    maxEventRate = Float(20.0).tag(sync=True) #maximum number of mouse events/s
 
     def connect(self):
         self.state = 'connect'
@@ -0,0 +1,210 @@
+/******************************************************************************
+ * Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *****************************************************************************/
+
+/*
+ * Decodes frames in a Web Worker, so that neither image decoding nor
+ * expanding raw RGB pixels holds up the notebook's main thread. The worker
+ * answers each frame with an ImageBitmap, which the view only has to draw.
+ */
+
+//the worker, built from this function's source; it can't use anything
+//from outside of it. Raw frames and tiles are drawn into an OffscreenCanvas
+//that keeps the current frame, for the next tiles to patch; image codecs
+//decode with createImageBitmap and leave that frame alone, since previews
+//are shown in between refined tiles.
+function frameWorker(){
+    var TYPES = {jpeg: 'image/jpeg', webp: 'image/webp', png: 'image/png'};
+    var canvas = null;
+    var ctx = null;
+
+    function frameContext(w, h){
+        if(!canvas){
+            canvas = new OffscreenCanvas(w, h);
+            ctx = canvas.getContext('2d');
+        }else if(canvas.width != w || canvas.height != h){
+            [canvas.width, canvas.height] = [w, h];
+        }
+        return ctx;
+    }
+
+    function putPixels(x, y, w, h, nc, pixels){
+        let img;
+        if(nc == 4){
+            img = new ImageData(new Uint8ClampedArray(
+                pixels.buffer, pixels.byteOffset, w*h*4), w, h);
+        }else{
+            img = new ImageData(w, h);
+            let data = img.data;
+            for(let i=0, j=0; i<data.length; i+=4, j+=nc){
+                data[i+0] = pixels[j+0];
+                data[i+1] = pixels[j+1];
+                data[i+2] = pixels[j+2];
+                data[i+3] = 255;
+            }
+        }
+        ctx.putImageData(img, x, y);
+    }
+
+    //see TileDiffer in frames.py for the layout
+    function drawTiles(bytes){
+        let header = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        let fw = header.getUint16(0, true);
+        let fh = header.getUint16(2, true);
+        let nc = header.getUint16(4, true);
+        let nt = header.getUint16(6, true);
+        frameContext(fw, fh);
+        let offset = 8 + 8*nt;
+        for(let t=0; t<nt; t++){
+            let x = header.getUint16(8 + 8*t + 0, true);
+            let y = header.getUint16(8 + 8*t + 2, true);
+            let w = header.getUint16(8 + 8*t + 4, true);
+            let h = header.getUint16(8 + 8*t + 6, true);
+            putPixels(x, y, w, h, nc,
+                new Uint8Array(bytes.buffer, bytes.byteOffset + offset, w*h*nc));
+            offset += w*h*nc;
+        }
+        return createImageBitmap(canvas);
+    }
+
+    function inflate(bytes){
+        let stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+        return new Response(stream).arrayBuffer().then(function(b){ return new Uint8Array(b); });
+    }
+
+    function decode(frame){
+        let bytes = new Uint8Array(frame.buffer);
+        if(frame.kind == 'raw'){
+            let [w, h] = frame.size;
+            frameContext(w, h);
+            putPixels(0, 0, w, h, bytes.length/(w*h), bytes);
+            return createImageBitmap(canvas);
+        }else if(frame.kind == 'tiles' || frame.codec == 'raw'){
+            return drawTiles(bytes);
+        }else if(frame.codec == 'zlib'){
+            return inflate(bytes).then(drawTiles);
+        }
+        return createImageBitmap(new Blob([bytes], {type: TYPES[frame.codec]}));
+    }
+
+    self.onmessage = function(e){
+        let t0 = performance.now();
+        decode(e.data).then(function(bitmap){
+            self.postMessage({bitmap: bitmap, decode: performance.now() - t0}, [bitmap]);
+        }, function(err){
+            self.postMessage({error: String(err)});
+        });
+    };
+}
+
+//codecs the worker decodes; others stay with frameDecoders in widgets.js
+var WORKER_CODECS = ['jpeg', 'webp', 'png', 'raw', 'zlib'];
+
+//true if the worker draws frames like info into its canvas, rather than
+//decoding them on their own; see decode in frameWorker
+function drawsCanvas(info){
+    return info.kind == 'raw' || info.kind == 'tiles' ||
+        info.codec == 'raw' || info.codec == 'zlib';
+}
+
+//true if frames like info draw all of the canvas; tiles patch it
+function replacesCanvas(info){
+    return info.kind == 'raw' || info.codec == 'raw' || info.codec == 'zlib';
+}
+
+/*
+ * Feeds frames to the worker one at a time. Frames arriving while one is
+ * being decoded wait. Frames drawn into the worker's canvas queue up, since
+ * tiles patch the frame before them, until one that replaces all of the
+ * canvas drops them. Image frames, such as previews, only replace waiting
+ * image frames, behind the canvas frames.
+ * draw(bitmap, info, ms) is called with every decoded frame, and
+ * failed(info, error) with every frame the worker couldn't decode.
+ */
+function FrameDecoder(worker, url, draw, failed){
+    this.worker = worker;
+    this.url = url;
+    this.draw = draw;
+    this.failed = failed;
+    this.waiting = [];   //[info, bytes] of frames not sent to the worker yet
+    this.current = null; //info of the frame being decoded
+    this.dropped = 0;
+
+    let decoder = this;
+    worker.onmessage = function(e){
+        let info = decoder.current;
+        decoder.current = null;
+        if(e.data.error){
+            decoder.failed(info, e.data.error);
+        }else{
+            decoder.draw(e.data.bitmap, info, e.data.decode);
+        }
+        decoder.next();
+    };
+}
+
+//returns a decoder, or null if the browser can't decode in a worker (or a
+//content security policy forbids blob: workers)
+FrameDecoder.create = function(draw, failed){
+    if(typeof Worker === 'undefined' || typeof OffscreenCanvas === 'undefined' ||
+            typeof createImageBitmap === 'undefined'){
+        return null;
+    }
+    let url = URL.createObjectURL(new Blob(['(' + frameWorker.toString() + ')();'],
+        {type: 'text/javascript'}));
+    try{
+        return new FrameDecoder(new Worker(url), url, draw, failed);
+    }catch(e){
+        URL.revokeObjectURL(url);
+        return null;
+    }
+};
+
+//true if the worker decodes frames like info
+FrameDecoder.prototype.accepts = function(info){
+    return info.kind != 'compressed' || WORKER_CODECS.indexOf(info.codec) >= 0;
+};
+
+FrameDecoder.prototype.push = function(info, bytes){
+    let keep = [];
+    if(!replacesCanvas(info)){
+        keep = this.waiting.filter(function(frame){ return drawsCanvas(frame[0]); });
+    }
+    this.dropped += this.waiting.length - keep.length;
+    keep.push([info, bytes]);
+    this.waiting = keep;
+    this.next();
+};
+
+FrameDecoder.prototype.next = function(){
+    if(this.current !== null || !this.waiting.length){
+        return;
+    }
+    let [info, bytes] = this.waiting.shift();
+    //the worker gets a buffer of its own; the message's may hold more
+    let buffer = bytes.slice().buffer;
+    this.current = info;
+    this.worker.postMessage({kind: info.kind, codec: info.codec, size: info.size,
+        buffer: buffer}, [buffer]);
+};
+
+FrameDecoder.prototype.terminate = function(){
+    this.worker.terminate();
+    URL.revokeObjectURL(this.url);
+};
+
+module.exports = {
+    FrameDecoder : FrameDecoder
+};
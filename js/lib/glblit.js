@@ -0,0 +1,104 @@
+/******************************************************************************
+ * Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *****************************************************************************/
+
+/*
+ * Draws raw RGB frames through a WebGL texture, so that the browser never
+ * has to expand them to RGBA pixel by pixel. Frames are top-down row order.
+ */
+var VERTEX_SHADER = [
+    'attribute vec2 pos;',
+    'varying vec2 uv;',
+    'void main(){',
+    '    uv = vec2(0.5 + 0.5*pos.x, 0.5 - 0.5*pos.y);',
+    '    gl_Position = vec4(pos, 0.0, 1.0);',
+    '}'
+].join('\n');
+
+var FRAGMENT_SHADER = [
+    'precision mediump float;',
+    'uniform sampler2D frame;',
+    'varying vec2 uv;',
+    'void main(){',
+    '    gl_FragColor = vec4(texture2D(frame, uv).rgb, 1.0);',
+    '}'
+].join('\n');
+
+function compileShader(gl, type, src){
+    let shader = gl.createShader(type);
+    gl.shaderSource(shader, src);
+    gl.compileShader(shader);
+    if(!gl.getShaderParameter(shader, gl.COMPILE_STATUS)){
+        throw new Error(gl.getShaderInfoLog(shader));
+    }
+    return shader;
+}
+
+function GLBlitter(gl){
+    this.gl = gl;
+    this.width = 0;  //texture size
+    this.height = 0;
+
+    let program = gl.createProgram();
+    gl.attachShader(program, compileShader(gl, gl.VERTEX_SHADER, VERTEX_SHADER));
+    gl.attachShader(program, compileShader(gl, gl.FRAGMENT_SHADER, FRAGMENT_SHADER));
+    gl.linkProgram(program);
+    gl.useProgram(program);
+    this.program = program;
+
+    //full-screen quad as a triangle strip
+    gl.bindBuffer(gl.ARRAY_BUFFER, gl.createBuffer());
+    gl.bufferData(gl.ARRAY_BUFFER, new Float32Array([-1,-1, 1,-1, -1,1, 1,1]), gl.STATIC_DRAW);
+    let pos = gl.getAttribLocation(program, 'pos');
+    gl.enableVertexAttribArray(pos);
+    gl.vertexAttribPointer(pos, 2, gl.FLOAT, false, 0, 0);
+
+    //frames are rarely a power of two, so no mipmaps and no wrapping
+    this.texture = gl.createTexture();
+    gl.bindTexture(gl.TEXTURE_2D, this.texture);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER, gl.LINEAR);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MAG_FILTER, gl.LINEAR);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_S, gl.CLAMP_TO_EDGE);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_T, gl.CLAMP_TO_EDGE);
+    gl.pixelStorei(gl.UNPACK_ALIGNMENT, 1);
+}
+
+//returns a blitter drawing to canvas, or null if WebGL isn't available
+GLBlitter.create = function(canvas){
+    let gl = canvas.getContext('webgl');
+    return gl ? new GLBlitter(gl) : null;
+};
+
+//uploads a w*h block of RGB pixels at (x,y) of a fw*fh frame; call draw()
+//once all blocks of a frame are uploaded
+GLBlitter.prototype.upload = function(fw, fh, x, y, w, h, pixels){
+    let gl = this.gl;
+    gl.bindTexture(gl.TEXTURE_2D, this.texture);
+    if(fw != this.width || fh != this.height){
+        gl.texImage2D(gl.TEXTURE_2D, 0, gl.RGB, fw, fh, 0, gl.RGB, gl.UNSIGNED_BYTE, null);
+        [this.width, this.height] = [fw, fh];
+    }
+    gl.texSubImage2D(gl.TEXTURE_2D, 0, x, y, w, h, gl.RGB, gl.UNSIGNED_BYTE, pixels);
+};
+
+GLBlitter.prototype.draw = function(){
+    let gl = this.gl;
+    gl.viewport(0, 0, gl.canvas.width, gl.canvas.height);
+    gl.drawArrays(gl.TRIANGLE_STRIP, 0, 4);
+};
+
+module.exports = {
+    GLBlitter : GLBlitter
+};
@@ -0,0 +1,332 @@
+/******************************************************************************
+ * Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *****************************************************************************/
+
+/*
+ * Reprojects the latest frame for the camera the mouse is moving to, so
+ * that interaction shows up right away instead of a round trip later. The
+ * frame's depth buffer is unprojected into a mesh in world space, textured
+ * with the frame, and drawn through the predicted camera: the frame's
+ * camera with the mouse deltas the kernel hadn't applied to it yet. The
+ * mesh is a rubber sheet, so silhouettes smear as the camera turns; it only
+ * has to last until the real frame arrives.
+ */
+var VERTEX_SHADER = [
+    'attribute vec3 pos;',
+    'attribute vec2 uv;',
+    'uniform mat4 mvp;',
+    'varying vec2 vuv;',
+    'void main(){',
+    '    vuv = uv;',
+    '    gl_Position = mvp*vec4(pos, 1.0);',
+    '}'
+].join('\n');
+
+var FRAGMENT_SHADER = [
+    'precision mediump float;',
+    'uniform sampler2D frame;',
+    'varying vec2 vuv;',
+    'void main(){',
+    '    gl_FragColor = vec4(texture2D(frame, vuv).rgb, 1.0);',
+    '}'
+].join('\n');
+
+var MAX_VERTICES = 65535; //indices are 16 bit
+var MAX_DELTAS = 4096;
+
+// vector math on [x,y,z] arrays
+function sub(a, b){ return [a[0]-b[0], a[1]-b[1], a[2]-b[2]]; }
+function add(a, b){ return [a[0]+b[0], a[1]+b[1], a[2]+b[2]]; }
+function scale(a, s){ return [a[0]*s, a[1]*s, a[2]*s]; }
+function dot(a, b){ return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]; }
+function cross(a, b){
+    return [a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0]];
+}
+function normalize(a){ return scale(a, 1.0/Math.sqrt(dot(a, a))); }
+
+/*
+ * The turntable camera models of camera_models.py, for one mouse delta.
+ * Cameras are {position, focalPoint, viewUp, viewAngle} as in the frames'
+ * camera metadata; each returns a new camera.
+ */
+function rotateCamera(cam, d, rotateScale, phiLimit){
+    let f = cam.focalPoint;
+    let p = sub(cam.position, f);
+    let b1 = normalize(cam.viewUp);
+    let b0 = normalize(cross(b1, p));
+    let b2 = cross(b0, b1);
+    let r = Math.sqrt(dot(p, p));
+    let phi = Math.asin(dot(p, b1)/r);
+
+    let theta = -rotateScale*d.x;
+    phi = Math.min(phiLimit, Math.max(-phiLimit, phi - rotateScale*d.y));
+
+    let c = r*Math.cos(phi);
+    p = add(add(scale(b0, c*Math.sin(theta)), scale(b1, r*Math.sin(phi))),
+        scale(b2, c*Math.cos(theta)));
+    return Object.assign({}, cam, {position: add(p, f)});
+}
+
+function panCamera(cam, d){
+    let p = sub(cam.position, cam.focalPoint);
+    let h = normalize(cross(p, cam.viewUp));
+    let v = normalize(cross(p, h));
+    let s = Math.sqrt(dot(p, p))*2*Math.tan(Math.PI*cam.viewAngle/360);
+    let f = add(cam.focalPoint, scale(add(scale(h, d.x), scale(v, d.y)), s));
+    return Object.assign({}, cam, {position: add(p, f), focalPoint: f});
+}
+
+function zoomCamera(cam, wheel, zoomScale){
+    let rlim = 0.00001; //minimum allowable radius, as in PVDisplay.__zoomCam
+    let p = sub(cam.position, cam.focalPoint);
+    let r = Math.sqrt(dot(p, p));
+    let rz = Math.max(rlim, r*Math.pow(1.0 + zoomScale, wheel));
+    return Object.assign({}, cam, {position: add(scale(p, rz/r), cam.focalPoint)});
+}
+
+// column-major 4x4 matrices, as WebGL takes them
+function lookAt(p, f, u){
+    let z = normalize(sub(f, p));
+    let x = normalize(cross(z, u));
+    let y = cross(x, z);
+    return new Float32Array([
+        x[0], y[0], -z[0], 0,
+        x[1], y[1], -z[1], 0,
+        x[2], y[2], -z[2], 0,
+        -dot(x, p), -dot(y, p), dot(z, p), 1]);
+}
+
+function perspective(viewAngle, aspect, near, far){
+    let t = 1.0/Math.tan(Math.PI*viewAngle/360);
+    return new Float32Array([
+        t/aspect, 0, 0, 0,
+        0, t, 0, 0,
+        0, 0, (far+near)/(near-far), -1,
+        0, 0, 2*far*near/(near-far), 0]);
+}
+
+function multiply(a, b){
+    let m = new Float32Array(16);
+    for(let c=0; c<4; c++){
+        for(let r=0; r<4; r++){
+            m[4*c+r] = a[r]*b[4*c] + a[4+r]*b[4*c+1] + a[8+r]*b[4*c+2] + a[12+r]*b[4*c+3];
+        }
+    }
+    return m;
+}
+
+function compileShader(gl, type, src){
+    let shader = gl.createShader(type);
+    gl.shaderSource(shader, src);
+    gl.compileShader(shader);
+    if(!gl.getShaderParameter(shader, gl.COMPILE_STATUS)){
+        throw new Error(gl.getShaderInfoLog(shader));
+    }
+    return shader;
+}
+
+function Reprojector(gl){
+    this.gl = gl;
+    this.frame = null;   //{camera, applied, turntable} of the frame in the mesh
+    this.deltas = [];    //[event, data, t] mouse deltas, oldest first
+    this.indices = 0;    //index count of the mesh
+
+    let program = gl.createProgram();
+    gl.attachShader(program, compileShader(gl, gl.VERTEX_SHADER, VERTEX_SHADER));
+    gl.attachShader(program, compileShader(gl, gl.FRAGMENT_SHADER, FRAGMENT_SHADER));
+    gl.linkProgram(program);
+    gl.useProgram(program);
+    this.mvp = gl.getUniformLocation(program, 'mvp');
+
+    this.positions = gl.createBuffer();
+    let pos = gl.getAttribLocation(program, 'pos');
+    gl.bindBuffer(gl.ARRAY_BUFFER, this.positions);
+    gl.enableVertexAttribArray(pos);
+    gl.vertexAttribPointer(pos, 3, gl.FLOAT, false, 0, 0);
+
+    this.uvs = gl.createBuffer();
+    let uv = gl.getAttribLocation(program, 'uv');
+    gl.bindBuffer(gl.ARRAY_BUFFER, this.uvs);
+    gl.enableVertexAttribArray(uv);
+    gl.vertexAttribPointer(uv, 2, gl.FLOAT, false, 0, 0);
+
+    this.triangles = gl.createBuffer();
+    this.grid = null; //[gw, gh] the uvs and triangles are for
+
+    this.texture = gl.createTexture();
+    gl.bindTexture(gl.TEXTURE_2D, this.texture);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER, gl.LINEAR);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MAG_FILTER, gl.LINEAR);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_S, gl.CLAMP_TO_EDGE);
+    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_T, gl.CLAMP_TO_EDGE);
+
+    gl.enable(gl.DEPTH_TEST);
+    gl.clearColor(0, 0, 0, 1);
+}
+
+//returns a reprojector drawing to canvas, or null if WebGL isn't available
+Reprojector.create = function(canvas){
+    let gl = canvas.getContext('webgl');
+    return gl ? new Reprojector(gl) : null;
+};
+
+//uploads the uvs and triangles of a gw*gh vertex grid, if it changed size
+Reprojector.prototype.setGrid = function(gw, gh){
+    if(this.grid && this.grid[0] == gw && this.grid[1] == gh){
+        return;
+    }
+    let gl = this.gl;
+    let uvs = new Float32Array(2*gw*gh);
+    for(let j=0, k=0; j<gh; j++){
+        for(let i=0; i<gw; i++, k+=2){
+            uvs[k] = i/(gw-1);
+            uvs[k+1] = j/(gh-1);
+        }
+    }
+    gl.bindBuffer(gl.ARRAY_BUFFER, this.uvs);
+    gl.bufferData(gl.ARRAY_BUFFER, uvs, gl.STATIC_DRAW);
+
+    let triangles = new Uint16Array(6*(gw-1)*(gh-1));
+    for(let j=0, k=0; j<gh-1; j++){
+        for(let i=0; i<gw-1; i++, k+=6){
+            let v = j*gw + i;
+            triangles.set([v, v+gw, v+1, v+1, v+gw, v+gw+1], k);
+        }
+    }
+    gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, this.triangles);
+    gl.bufferData(gl.ELEMENT_ARRAY_BUFFER, triangles, gl.STATIC_DRAW);
+    this.grid = [gw, gh];
+    this.indices = triangles.length;
+};
+
+/*
+ * Replaces the mesh with a frame's: info is the frame message (see
+ * PVDisplay.__commFrame), depths the dw*dh top-down window depths as
+ * uint16, and image the frame as anything texImage2D takes. Deltas the
+ * frame's camera already has are dropped.
+ */
+Reprojector.prototype.setFrame = function(info, dw, dh, depths, image){
+    let gl = this.gl;
+    let cam = info.camera;
+    let [near, far] = cam.clippingRange;
+    let aspect = gl.canvas.width/gl.canvas.height;
+    let ty = Math.tan(Math.PI*cam.viewAngle/360);
+    let tx = ty*aspect;
+
+    //every s-th depth sample becomes a vertex, as many as the indices allow
+    let s = Math.max(1, Math.ceil(Math.sqrt(dw*dh/MAX_VERTICES)));
+    while(Math.ceil(dw/s)*Math.ceil(dh/s) > MAX_VERTICES){
+        s++;
+    }
+    let gw = Math.ceil(dw/s);
+    let gh = Math.ceil(dh/s);
+    if(gw < 2 || gh < 2){
+        return;
+    }
+
+    //unprojects each vertex: window depth to distance along the view
+    //direction, then out along the pixel's ray in the camera's basis
+    let p = cam.position;
+    let z = normalize(sub(cam.focalPoint, p));
+    let x = normalize(cross(z, cam.viewUp));
+    let y = cross(x, z);
+    let positions = new Float32Array(3*gw*gh);
+    for(let j=0, k=0; j<gh; j++){
+        let py = Math.min(dh-1, Math.round(j*(dh-1)/(gh-1)));
+        let ny = 1 - 2*j/(gh-1);
+        for(let i=0; i<gw; i++, k+=3){
+            let px = Math.min(dw-1, Math.round(i*(dw-1)/(gw-1)));
+            let nx = 2*i/(gw-1) - 1;
+            let zn = 2*depths[py*dw + px]/0xffff - 1;
+            let d = 2*far*near/(far + near - zn*(far - near));
+            let ex = nx*tx*d;
+            let ey = ny*ty*d;
+            for(let c=0; c<3; c++){
+                positions[k+c] = p[c] + ex*x[c] + ey*y[c] + d*z[c];
+            }
+        }
+    }
+    this.setGrid(gw, gh);
+    gl.bindBuffer(gl.ARRAY_BUFFER, this.positions);
+    gl.bufferData(gl.ARRAY_BUFFER, positions, gl.DYNAMIC_DRAW);
+
+    gl.bindTexture(gl.TEXTURE_2D, this.texture);
+    gl.texImage2D(gl.TEXTURE_2D, 0, gl.RGB, gl.RGB, gl.UNSIGNED_BYTE, image);
+
+    this.frame = {camera: cam, applied: info.applied, turntable: info.turntable};
+    if(info.applied !== null && info.applied !== undefined){
+        this.deltas = this.deltas.filter(function(e){ return e[2] > info.applied; });
+    }
+};
+
+//logs a mouse delta; t is the time of the event batch it's sent with
+Reprojector.prototype.moved = function(event, data, t){
+    this.deltas.push([event, data, t]);
+    if(this.deltas.length > MAX_DELTAS){
+        this.deltas.shift(); //frames stopped coming; the warp is stale anyway
+    }
+};
+
+//true if there are deltas the frame in the mesh doesn't have yet
+Reprojector.prototype.pending = function(){
+    return this.frame !== null && this.deltas.length > 0;
+};
+
+//the frame's camera, moved by the deltas it doesn't have
+Reprojector.prototype.predictedCamera = function(){
+    let cam = this.frame.camera;
+    let tt = this.frame.turntable;
+    for(let [event, data] of this.deltas){
+        if(event == 'rotate'){
+            cam = rotateCamera(cam, data, tt.rotateScale, tt.phiLimit);
+        }else if(event == 'pan'){
+            cam = panCamera(cam, data);
+        }else if(event == 'zoom'){
+            cam = zoomCamera(cam, data, tt.zoomScale);
+        }
+    }
+    return cam;
+};
+
+//draws the mesh through the predicted camera; false if there's nothing to
+//predict, and the latest frame is as good as it gets
+Reprojector.prototype.draw = function(){
+    if(!this.pending()){
+        return false;
+    }
+    let gl = this.gl;
+    let cam = this.predictedCamera();
+    //the depths reach from the frame's near to its far plane; keep them in
+    //view as the camera moves
+    let [near, far] = this.frame.camera.clippingRange;
+    let r = Math.sqrt(dot(sub(cam.position, this.frame.camera.position),
+        sub(cam.position, this.frame.camera.position)));
+    let proj = perspective(cam.viewAngle, gl.canvas.width/gl.canvas.height,
+        Math.max(near*0.5 - r, near*0.01), far*2 + r);
+    gl.uniformMatrix4fv(this.mvp, false,
+        multiply(proj, lookAt(cam.position, cam.focalPoint, cam.viewUp)));
+
+    gl.viewport(0, 0, gl.canvas.width, gl.canvas.height);
+    gl.clear(gl.COLOR_BUFFER_BIT | gl.DEPTH_BUFFER_BIT);
+    gl.drawElements(gl.TRIANGLES, this.indices, gl.UNSIGNED_SHORT, 0);
+    return true;
+};
+
+module.exports = {
+    Reprojector : Reprojector,
+    rotateCamera : rotateCamera,
+    panCamera : panCamera,
+    zoomCamera : zoomCamera
+};
@@ -16,6 +16,9 @@
 
 var widgets = require('@jupyter-widgets/base');
 var _ = require('lodash');
+var GLBlitter = require('./glblit.js').GLBlitter;
+var FrameDecoder = require('./framedecoder.js').FrameDecoder;
+var Reprojector = require('./reproject.js').Reprojector;
 
 var PVDisplayModel = widgets.DOMWidgetModel.extend({
     defaults: _.extend(widgets.DOMWidgetModel.prototype.defaults(), {
@@ -29,12 +32,203 @@ var PVDisplayModel = widgets.DOMWidgetModel.extend({
 });
 
 /*
- * Helper functions for vector math
+ * Mouse interaction shared by the views. Returns a function adding the
+ * handlers to a render surface; send(msg) gets the coalesced camera events,
+ * at most view.model's maxEventRate per second. Each carries the time t of
+ * the oldest mouse event in it, for latency measurements. moved(event,
+ * data, t), if given, gets every mouse delta as it happens, with the t of
+ * the message it will be sent in.
  */
+function mouseHandlers(view, send, moved){
+    var m0 = {x: 0.0, y: 0.0}; //last mouse position
+
+    //converts mouse from canvas space to NDC
+    function getNDC(e){
+        let rect = view.renderSurface.getBoundingClientRect();
+
+        //compute current mouse coords in NDC
+        let mx = (e.clientX - rect.left)/(rect.right-rect.left);
+        let my = (e.clientY - rect.top)/(rect.top-rect.bottom);
+
+        return {x: mx, y: my};
+    };
+
+    function getMouseDelta(e){
+        let m1 = getNDC(e);
+        let md = {x: m1.x-m0.x, y: m1.y-m0.y};
+        m0 = m1;
+        return md;
+    };
+
+
+    var lastMouseT = Date.now();
+    var wheelAccum = 0.0;
+    var pending = {}; //mouse deltas accumulated while throttled
+    var pendingT = null; //time of the oldest accumulated mouse event
+    var flushTimer = null;
+
+
+    //sends everything accumulated since the last send
+    function flush(){
+        clearTimeout(flushTimer);
+        flushTimer = null;
+        lastMouseT = Date.now();
+        for(let event in pending){
+            send({event: event, 'data': pending[event], t: pendingT});
+        }
+        pending = {};
+        if(wheelAccum){
+            send({event: 'zoom', 'data': wheelAccum, t: pendingT});
+        }
+        wheelAccum = 0.0;
+        pendingT = null;
+    };
+
+    //flushes now if maxEventRate allows, otherwise as soon as it does
+    function scheduleFlush(){
+        if(pendingT === null){
+            pendingT = Date.now();
+        }
+        let wait = 1000.0/view.model.get('maxEventRate') - (Date.now() - lastMouseT);
+        if(wait <= 0){
+            flush();
+        }else if(flushTimer === null){
+            flushTimer = setTimeout(flush, wait);
+        }
+    };
+
+    //merges the delta of every mouse move, so none are dropped
+    function accumulate(event, e){
+        let md = getMouseDelta(e);
+        let d = pending[event] || {x: 0.0, y: 0.0};
+        pending[event] = {x: d.x+md.x, y: d.y+md.y};
+        notify(event, md);
+        scheduleFlush();
+    };
+
+    function notify(event, data){
+        if(moved){
+            if(pendingT === null){
+                pendingT = Date.now();
+            }
+            moved(event, data, pendingT);
+        }
+    };
+
+
+    // Mouse event handling -- drag and scroll
+    function handleDrag(e){
+        accumulate('rotate', e);
+    };
+
+    function handleMidDrag(e){
+        accumulate('pan', e);
+    };
+
+    function handleScroll(e){
+        e.preventDefault();
+        e.stopPropagation();
+        wheelAccum += Math.sign(e.deltaY);
+        notify('zoom', Math.sign(e.deltaY));
+        scheduleFlush();
+    };
+
+    // Add event handlers to a render surface. Drags are followed on view.el,
+    // since the surface may be swapped for another one halfway through
+    return function addListeners(surface) {
+        surface.addEventListener('mousedown',function(e){
+            m0 = getNDC(e);
+            if(e.button == 0){
+                view.el.addEventListener('mousemove',handleDrag,false);
+            }else if(e.button == 1){
+                e.preventDefault();
+                view.el.addEventListener('mousemove',handleMidDrag,false);
+            }
+        }, false);
+
+        surface.addEventListener('mouseup',function(e){
+            if(e.button == 0){
+                view.el.removeEventListener('mousemove',handleDrag,false);
+            }else if(e.button == 1){
+                view.el.removeEventListener('mousemove',handleMidDrag,false);
+            }
+        }, false);
+
+        surface.addEventListener('wheel', handleScroll, false);
+    };
+}
+
+//shows encoded image bytes in img through an object URL; calls done(ok)
+//once the image has loaded or failed to. A frame still loading when the
+//next one comes in never does, so its URL is revoked right away.
+function showImage(img, bytes, type, done){
+    if(img.frameUrl){
+        URL.revokeObjectURL(img.frameUrl);
+    }
+    let url = URL.createObjectURL(new Blob([bytes], {type: type}));
+    let settle = function(ok){
+        return function(){
+            URL.revokeObjectURL(url);
+            if(img.frameUrl == url){
+                img.frameUrl = null;
+            }
+            done(ok);
+        };
+    };
+    img.frameUrl = url;
+    img.onload = settle(true);
+    img.onerror = settle(false);
+    img.src = url;
+}
+
+/*
+ * Decoders for the codecs of compressed frames (see CODECS in frames.py), by
+ * codec name. decode(view, bytes, done) shows the frame in view and calls
+ * done() once it's on screen, or once it failed to decode so that the
+ * kernel doesn't wait for it. Decoders drawing into the canvas call
+ * view.failed(error) instead, for the kernel to send a full frame next.
+ * Codecs registered in the kernel need a decoder added here.
+ */
+function imageDecoder(type){
+    return function(view, bytes, done){
+        showImage(view.img, bytes, type, function(ok){
+            if(ok){
+                view.ensureDisplayMode('compressed');
+            }
+            done();
+        });
+    };
+}
+
+//inflates zlib data; resolves to a Uint8Array
+function inflate(bytes){
+    let stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Response(stream).arrayBuffer().then(function(b){ return new Uint8Array(b); });
+}
+
+var frameDecoders = {
+    jpeg: imageDecoder('image/jpeg'),
+    webp: imageDecoder('image/webp'),
+    png: imageDecoder('image/png'),
+    //a single full frame tile; see TileDiffer.pack
+    raw: function(view, bytes, done){
+        view.drawTiles(bytes);
+        done();
+    },
+    zlib: function(view, bytes, done){
+        inflate(bytes).then(function(raw){
+            view.drawTiles(raw);
+            done();
+        }).catch(function(err){
+            view.failed(err);
+        });
+    },
+};
+
 var PVDisplayView = widgets.DOMWidgetView.extend({
         render: function(){
-            this.model.on('change:compressedFrame', this.compressedFrameChange, this);
-            this.model.on('change:frame', this.frameChange, this);
+            this.model.on('msg:custom', this.customMsg, this);
+            this.framesReceived = 0;
 
             // Create 'div' and 'canvas', and attach them to the...erm, "el"
             this.renderWindow = document.createElement('div');
@@ -43,6 +237,17 @@ var PVDisplayView = widgets.DOMWidgetView.extend({
             // for compressed frames
             this.img = document.createElement('img');
             this.img.setAttribute('draggable', false);
+
+            // for raw RGB frames, drawn through WebGL; created on first use
+            this.glCanvas = document.createElement('canvas');
+            this.blitter = undefined;
+
+            // for frames reprojected to the predicted camera while the next
+            // one renders; only with depth frames, see PVDisplay's depthFrames
+            this.warpCanvas = document.createElement('canvas');
+            this.reprojector = undefined;
+            this.framesWithDepth = 0;
+            this.warpScheduled = false;
             
             // for raw frames
             this.renderWindow.appendChild(this.canvas);
@@ -56,104 +261,61 @@ var PVDisplayView = widgets.DOMWidgetView.extend({
             let view = this;
             let model = view.model;
 
-            [this.canvas.width,this.canvas.height] = model.get('resolution');
-
-            //Perform the initial render
-            let ctx = this.canvas.getContext('2d');
-            if(ctx){
-                let frame = new Uint8Array(this.model.get('frame').buffer);
-                let imgData = ctx.createImageData(this.canvas.width, this.canvas.height);
-                for(let i=0; i<imgData.data.length; i+=4){
-                    imgData.data[i+0] = frame[i+0];
-                    imgData.data[i+1] = frame[i+1];
-                    imgData.data[i+2] = frame[i+2];
-                    imgData.data[i+3] = 255;
-                }
-                ctx.putImageData(imgData, 0, 0);
-            }
-
-            var m0 = {x: 0.0, y: 0.0}; //last mouse position
-
-            //converts mouse from canvas space to NDC
-            function getNDC(e){
-                let rect = view.renderSurface.getBoundingClientRect();
-
-                //compute current mouse coords in NDC
-                let mx = (e.clientX - rect.left)/(rect.right-rect.left);
-                let my = (e.clientY - rect.top)/(rect.top-rect.bottom);
-
-                return {x: mx, y: my};
-            };
-
-            function getMouseDelta(e){
-                let m1 = getNDC(e);
-                let md = {x: m1.x-m0.x, y: m1.y-m0.y};
-                m0 = m1;
-                return md;
-            };
-
-
-            var lastMouseT = Date.now();
-            var wheelAccum = 0.0;
+            //decodes frames off the main thread where the browser can;
+            //null otherwise, and frames are decoded here
+            this.decoder = FrameDecoder.create(function(bitmap, info, ms){
+                view.drawBitmap(bitmap, info, ms);
+            }, function(info, err){
+                view.frameFailed(info, err);
+            });
 
+            [this.canvas.width,this.canvas.height] = model.get('resolution');
+            [this.glCanvas.width,this.glCanvas.height] = model.get('resolution');
+            [this.warpCanvas.width,this.warpCanvas.height] = model.get('resolution');
 
-            // Mouse event handling -- drag and scroll
-            function handleDrag(e){
-                t = Date.now();
-                if(t - lastMouseT > 1000.0/model.get('maxEventRate')){
-                    view.send({event: 'rotate', 'data': getMouseDelta(e)});
-                    lastMouseT = t;
-                }
-            };
+            //preview frames may be scaled down; always show them at full size
+            this.img.style.width = this.canvas.width + 'px';
+            this.img.style.height = this.canvas.height + 'px';
 
-            function handleMidDrag(e){
-                t = Date.now();
-                if(t - lastMouseT > 1000.0/model.get('maxEventRate')){
-                    view.send({event: 'pan', 'data': getMouseDelta(e)});
-                    lastMouseT = t;
-                }
-            };
+            //in delta mode, the latest tiles only make sense on top of the
+            //frames this view never saw; ask for a full frame instead
+            view.send({event: 'keyframe'});
 
-            function handleScroll(e){
-                e.preventDefault();
-                e.stopPropagation();
-                wheelAccum += Math.sign(e.deltaY);
-
-                t = Date.now();
-                if(t - lastMouseT > 1000.0/model.get('maxEventRate')){
-                    if(wheelAccum){
-                        view.send({event: 'zoom', 'data': wheelAccum});
-                    }
-                    wheelAccum = 0.0;
-                    lastMouseT = t;
-                }
-            };
-
-            // Add event handlers to render surfaces
-            function addListeners(surface) {
-                surface.addEventListener('mousedown',function(e){
-                    m0 = getNDC(e);
-                    if(e.button == 0){
-                        view.renderSurface.addEventListener('mousemove',handleDrag,false);
-                    }else if(e.button == 1){
-                        e.preventDefault();
-                        view.renderSurface.addEventListener('mousemove',handleMidDrag,false);
-                    }
-                }, false);
-
-                surface.addEventListener('mouseup',function(e){
-                    if(e.button == 0){
-                        view.renderSurface.removeEventListener('mousemove',handleDrag,false);
-                    }else if(e.button == 1){
-                        view.renderSurface.removeEventListener('mousemove',handleMidDrag,false);
-                    }
-                }, false);
-
-                surface.addEventListener('wheel', handleScroll, false);
-            };
+            let addListeners = mouseHandlers(view, function(msg){ view.send(msg); },
+                function(event, data, t){ view.predict(event, data, t); });
 
             addListeners(view.img);
             addListeners(view.canvas);
+            addListeners(view.glCanvas);
+            addListeners(view.warpCanvas);
+
+            //tells the kernel whether this view is on screen, so that
+            //hidden views don't take render time from the others
+            this.viewId = Math.random().toString(36).slice(2);
+            this.onScreen = null;
+            this.intersecting = true;
+            this.reportVisibility = function(){ view.visibilityChanged(); };
+            document.addEventListener('visibilitychange', this.reportVisibility);
+            this.observer = null;
+            if(typeof IntersectionObserver !== 'undefined'){
+                this.observer = new IntersectionObserver(function(entries){
+                    view.intersecting = entries[entries.length-1].isIntersecting;
+                    view.visibilityChanged();
+                });
+                this.observer.observe(this.el);
+            }
+            this.visibilityChanged();
+    },
+
+    //reports going on or off screen; the kernel counts the views on screen
+    visibilityChanged: function(visible) {
+        if(visible === undefined){
+            visible = this.intersecting && !document.hidden;
+        }
+        if(visible !== this.onScreen){
+            this.onScreen = visible;
+            this.send({event: 'visibility', view: this.viewId, visible: visible});
+        }
     },
 
     setVisibility: function(element, visibility) {
@@ -170,41 +332,350 @@ var PVDisplayView = widgets.DOMWidgetView.extend({
         if (this.displayMode == mode) {
             return;
         }
-        if (mode == 'raw') {
-            this.setVisibility(this.canvas, true);
-            this.setVisibility(this.img, false);
-        } else {
-            this.setVisibility(this.canvas, false);
-            this.setVisibility(this.img, true);
+        let surfaces = {raw: this.canvas, gl: this.glCanvas, compressed: this.img,
+            warp: this.warpCanvas};
+        for (let m in surfaces) {
+            if (m != mode) {
+                this.setVisibility(surfaces[m], false);
+            }
         }
+        this.setVisibility(surfaces[mode], true);
         this.displayMode = mode;
     },
 
-    frameChange: function() {
+    //returns the WebGL blitter for RGB frames, or null without WebGL
+    getBlitter: function() {
+        if (this.blitter === undefined) {
+            this.blitter = GLBlitter.create(this.glCanvas);
+        }
+        return this.blitter;
+    },
+
+    //2D context to assemble a fw*fh frame in: the canvas itself, or for
+    //frames rendered at a lower resolution, a scratch canvas that present()
+    //scales up
+    frameContext: function(fw, fh) {
+        if (fw == this.canvas.width && fh == this.canvas.height) {
+            return this.canvas.getContext('2d');
+        }
+        if (!this.scratch) {
+            this.scratch = document.createElement('canvas');
+        }
+        if (this.scratch.width != fw || this.scratch.height != fh) {
+            [this.scratch.width, this.scratch.height] = [fw, fh];
+        }
+        return this.scratch.getContext('2d');
+    },
+
+    //shows a fw*fh frame once all its blocks are blitted, scaled to the canvas
+    present: function(fw, fh, glDraw) {
+        if (glDraw) {
+            this.blitter.draw(); //the texture is stretched over the canvas
+        } else if (this.displayMode == 'raw' &&
+                (fw != this.canvas.width || fh != this.canvas.height)) {
+            let ctx = this.canvas.getContext('2d');
+            ctx.drawImage(this.scratch, 0, 0, this.canvas.width, this.canvas.height);
+        }
+    },
+
+    //draws a w*h block of tightly packed RGB or RGBA pixels at (x,y) of a
+    //fw*fh frame. RGBA is wrapped as ImageData without copying, RGB goes
+    //through a WebGL texture; returns true if the blitter needs a draw()
+    blit: function(fw, fh, x, y, w, h, nc, pixels) {
+        if (nc == 3 && this.getBlitter()) {
+            this.ensureDisplayMode('gl');
+            this.blitter.upload(fw, fh, x, y, w, h, pixels);
+            return true;
+        }
+
         this.ensureDisplayMode('raw');
-        let ctx = this.canvas.getContext('2d');
-        if(ctx){
-            var imgData = ctx.createImageData(this.canvas.width,this.canvas.height);
-            let frame = new Uint8Array(this.model.get('frame').buffer);
-            for(let i=0; i<imgData.data.length; i+=4){
-                imgData.data[i+0] = frame[i+0];
-                imgData.data[i+1] = frame[i+1];
-                imgData.data[i+2] = frame[i+2];
+        let ctx = this.frameContext(fw, fh);
+        if (!ctx) {
+            return false;
+        }
+        let imgData;
+        if (nc == 4) {
+            imgData = new ImageData(new Uint8ClampedArray(
+                pixels.buffer, pixels.byteOffset, w*h*4), w, h);
+        } else {
+            //no WebGL; expand to RGBA the slow way
+            imgData = ctx.createImageData(w, h);
+            for(let i=0, j=0; i<imgData.data.length; i+=4, j+=nc){
+                imgData.data[i+0] = pixels[j+0];
+                imgData.data[i+1] = pixels[j+1];
+                imgData.data[i+2] = pixels[j+2];
                 imgData.data[i+3] = 255;
             }
-            ctx.putImageData(imgData, 0, 0);
         }
+        ctx.putImageData(imgData, x, y);
+        return false;
+    },
+
+    //frames arrive as custom messages with the frame bytes as the first
+    //buffer, and the packed depth, if any, as the second; see
+    //PVDisplay.__commFrame
+    customMsg: function(content, buffers) {
+        if(content.event == 'frame' && buffers.length){
+            let buf = buffers[0];
+            if(buffers.length > 1){
+                let depth = buffers[1];
+                content.depth = new Uint8Array(depth.buffer, depth.byteOffset,
+                    depth.byteLength);
+            }
+            this.frameReceived(content,
+                new Uint8Array(buf.buffer, buf.byteOffset, buf.byteLength));
+        }
+    },
+
+    //acknowledges a frame once it's on screen, with the motion-to-photon
+    //latency if the frame answers to mouse events, and the time the decode
+    //worker took, if it decoded the frame
+    frameDrawn: function(info, decodeMs) {
+        if(info.depth){
+            this.reproject(info);
+        }
+        if(info.n === undefined){
+            return; //nothing waits for this one
+        }
+        let msg = {event: 'frameDrawn', n: info.n};
+        if(info.t !== undefined){
+            msg.latency = Date.now() - info.t;
+        }
+        if(decodeMs !== undefined){
+            msg.decode = decodeMs;
+        }
+        this.send(msg);
+    },
+
+    //gives up on a frame that couldn't be decoded: the kernel mustn't wait
+    //for it, nor send tiles for a canvas that's missing it
+    frameFailed: function(info, err) {
+        console.warn('ipyparaview: frame decoding failed: ' + err);
+        let msg = {event: 'decodeError'};
+        if(info.n !== undefined){
+            msg.n = info.n;
+        }
+        this.send(msg);
+    },
+
+    //shows a frame the worker decoded, scaled to the canvas
+    drawBitmap: function(bitmap, info, decodeMs) {
+        this.ensureDisplayMode('raw');
+        let ctx = this.canvas.getContext('2d');
+        ctx.drawImage(bitmap, 0, 0, this.canvas.width, this.canvas.height);
+        bitmap.close();
+        this.frameDrawn(info, decodeMs);
+    },
+
+    frameReceived: function(info, bytes) {
+        let seq = ++this.framesReceived;
+        if(this.decoder && this.decoder.accepts(info)){
+            this.decoder.push(info, bytes);
+        }else if(info.kind == 'raw'){
+            //frames may be rendered smaller than the canvas
+            let [w, h] = info.size;
+            this.present(w, h, this.blit(w, h, 0, 0, w, h, bytes.length/(w*h), bytes));
+            this.frameDrawn(info);
+        }else if(info.kind == 'tiles'){
+            if(bytes.byteLength >= 8){
+                this.drawTiles(bytes);
+                this.frameDrawn(info);
+            }
+        }else if(info.kind == 'compressed'){
+            let decode = frameDecoders[info.codec];
+            if(!decode){
+                return;
+            }
+            //decoding may finish out of order; only the newest frame is shown
+            let view = this;
+            let newest = function(){ return seq == view.framesReceived; };
+            decode({
+                img: this.img,
+                ensureDisplayMode: function(mode){
+                    if(newest()) view.ensureDisplayMode(mode);
+                },
+                drawTiles: function(msg){
+                    if(newest()) view.drawTiles(msg);
+                },
+                failed: function(err){
+                    view.frameFailed(info, err);
+                },
+            }, bytes, function(){
+                if(newest()) view.frameDrawn(info);
+            });
+        }
+    },
+
+    //returns the reprojector for depth frames, or null without WebGL
+    getReprojector: function() {
+        if (this.reprojector === undefined) {
+            this.reprojector = Reprojector.create(this.warpCanvas);
+        }
+        return this.reprojector;
+    },
+
+    //hands a frame that's just been drawn to the reprojector, along with
+    //its depth; see packDepth in frames.py for the layout. The surface is
+    //copied right away, before the next frame replaces it.
+    reproject: function(info) {
+        let r = this.getReprojector();
+        if(!r){
+            return;
+        }
+        let seq = ++this.framesWithDepth;
+        let view = this;
+        let header = new DataView(info.depth.buffer, info.depth.byteOffset, 4);
+        let [dw, dh] = [header.getUint16(0, true), header.getUint16(2, true)];
+        Promise.all([inflate(info.depth.subarray(4)),
+                createImageBitmap(this.renderSurface)]).then(function([depths, image]){
+            if(seq == view.framesWithDepth){
+                r.setFrame(info, dw, dh, new Uint16Array(depths.buffer, 0, dw*dh), image);
+                //the mouse may have moved on since the frame was rendered
+                view.warp();
+            }
+            image.close();
+        });
+    },
+
+    //a mouse delta, yet to reach the kernel; shows the latest frame as seen
+    //from where the delta takes the camera
+    predict: function(event, data, t) {
+        if(this.reprojector){
+            this.reprojector.moved(event, data, t);
+            this.warp();
+        }
+    },
+
+    //draws the reprojected frame on the next animation frame
+    warp: function() {
+        if(this.warpScheduled){
+            return;
+        }
+        this.warpScheduled = true;
+        let view = this;
+        requestAnimationFrame(function(){
+            view.warpScheduled = false;
+            if(view.reprojector.draw()){
+                view.ensureDisplayMode('warp');
+            }
+        });
+    },
+
+    //draws packed tiles; see TileDiffer in frames.py for the layout
+    drawTiles: function(msg) {
+        let header = new DataView(msg.buffer, msg.byteOffset, msg.byteLength);
+        let fw = header.getUint16(0, true);
+        let fh = header.getUint16(2, true);
+        let nc = header.getUint16(4, true);
+        let nt = header.getUint16(6, true);
+        let offset = 8 + 8*nt;
+        let draw = false;
+        for(let t=0; t<nt; t++){
+            let x = header.getUint16(8 + 8*t + 0, true);
+            let y = header.getUint16(8 + 8*t + 2, true);
+            let w = header.getUint16(8 + 8*t + 4, true);
+            let h = header.getUint16(8 + 8*t + 6, true);
+            let pixels = new Uint8Array(msg.buffer, msg.byteOffset + offset, w*h*nc);
+            draw = this.blit(fw, fh, x, y, w, h, nc, pixels) || draw;
+            offset += w*h*nc;
+        }
+        this.present(fw, fh, draw);
+        //an empty update still switches back from a preview frame
+        if(nt == 0){
+            this.ensureDisplayMode(nc == 3 && this.getBlitter() ? 'gl' : 'raw');
+        }
+    },
+
+    remove: function() {
+        if(this.decoder){
+            this.decoder.terminate();
+        }
+        document.removeEventListener('visibilitychange', this.reportVisibility);
+        if(this.observer){
+            this.observer.disconnect();
+        }
+        this.visibilityChanged(false);
+        if(this.img.frameUrl){
+            URL.revokeObjectURL(this.img.frameUrl);
+        }
+        PVDisplayView.__super__.remove.apply(this, arguments);
+    },
+});
+
+var VStreamModel = widgets.DOMWidgetModel.extend({
+    defaults: _.extend(widgets.DOMWidgetModel.prototype.defaults(), {
+        _model_name : 'VStreamModel',
+        _view_name : 'VStreamView',
+        _model_module : 'ipyparaview',
+        _view_module : 'ipyparaview',
+        _model_module_version : '0.1.2',
+        _view_module_version : '0.1.2'
+    })
+});
+
+/*
+ * Shows the JPEG frames of a FrameServer (see stream.py) and sends mouse
+ * interaction back over the same WebSocket.
+ */
+var VStreamView = widgets.DOMWidgetView.extend({
+    render: function(){
+        this.model.on('change:state', this.stateChange, this);
+
+        this.img = document.createElement('img');
+        this.img.setAttribute('draggable', false);
+        this.el.appendChild(this.img);
+        this.renderSurface = this.img;
+        this.socket = null;
+
+        let view = this;
+        let addListeners = mouseHandlers(view, function(msg){
+            if(view.socket && view.socket.readyState == WebSocket.OPEN){
+                view.socket.send(JSON.stringify(msg));
+            }
+        });
+        addListeners(this.img);
+
+        this.stateChange();
+    },
+
+    stateChange: function() {
+        if(this.model.get('state') == 'connect'){
+            this.connect();
+        }
+    },
+
+    connect: function() {
+        this.disconnect();
+        let view = this;
+        let socket = new WebSocket(this.model.get('url'));
+        socket.binaryType = 'blob';
+        socket.onmessage = function(e){
+            //each message is a whole JPEG frame
+            showImage(view.img, e.data, 'image/jpeg', function(){});
+        };
+        this.socket = socket;
     },
 
-    compressedFrameChange: function() {
-        this.ensureDisplayMode('compressed');
-        let compressedFrame = new Uint8Array(this.model.get('compressedFrame').buffer);
-        var compressedFrameStr = new TextDecoder("utf-8").decode(compressedFrame);
-        this.img.src='data:image/jpeg;base64,' + compressedFrameStr;
+    disconnect: function() {
+        if(this.socket){
+            this.socket.close();
+            this.socket = null;
+        }
+    },
+
+    remove: function() {
+        this.disconnect();
+        if(this.img.frameUrl){
+            URL.revokeObjectURL(this.img.frameUrl);
+        }
+        VStreamView.__super__.remove.apply(this, arguments);
     },
 });
 
 module.exports = {
     PVDisplayModel : PVDisplayModel,
-    PVDisplayView : PVDisplayView
+    PVDisplayView : PVDisplayView,
+    VStreamModel : VStreamModel,
+    VStreamView : VStreamView,
+    frameDecoders : frameDecoders
 };
@@ -0,0 +1,102 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+#Fixtures for tests on the stand-ins in benchmarks.mock, which need neither
+#ParaView nor a GPU
+import struct
+import time
+import zlib
+import numpy as np
+import pytest
+
+from ipyparaview.camera_models import rotateCameraTurntable
+from ipyparaview.frames import quantizeDepth
+from ipyparaview.widgets import PVDisplay
+from ipyparaview.benchmarks.mock import MockParaView, MockRenderView, MockWindowToImage
+
+#a camera path for renderSequence, and a rotate event from the frontend
+KEYFRAMES = [([0,0,5], [0,0,0], [0,1,0]), ([5,0,0], [0,0,0], [0,1,0])]
+ROTATE = {'event': 'rotate', 'data': {'x': 0.1, 'y': 0.0}}
+
+def rotated(cam, x):
+    #the camera after rotate events adding up to x
+    p,f,u = rotateCameraTurntable({'x': x, 'y': 0.0}, *cam,
+            PVDisplay.rotateScale, PVDisplay.phiLimit)
+    return list(p)
+
+def unpackDepth(buf):
+    """The (h,w) uint16 depths of a frames.packDepth buffer"""
+    w,h = struct.unpack_from('<2H', buf)
+    return np.frombuffer(zlib.decompress(bytes(buf[4:])), '<u2').reshape(h, w)
+
+def mockDepth(size, step):
+    """The quantized depths of a MockRenderView of size, subsampled by step"""
+    view = MockRenderView(size)
+    view.render()
+    return quantizeDepth(view.zbuffer()[::-1][::step, ::step])
+
+def waitFor(cond, timeout=5.0):
+    """Polls cond() until it's true; returns its last value"""
+    t = time.time() + timeout
+    while not cond() and time.time() < t:
+        time.sleep(0.01)
+    return cond()
+
+@pytest.fixture
+def mockDisplay():
+    """Makes PVDisplays of MockRenderViews, closing them after the test
+
+    mockDisplay(size=(w,h), scene='static', renderTime=0.0, **PVDisplay arguments)
+    """
+    displays = []
+    def make(size=(64,48), scene='static', renderTime=0.0, **kwargs):
+        pvs = MockParaView(size=size, scene=scene, renderTime=renderTime)
+        disp = PVDisplay(pvs.CreateRenderView(), pvs=pvs, w2i=MockWindowToImage(),
+                **kwargs)
+        displays.append(disp)
+        return disp
+    yield make
+    for disp in displays:
+        disp.close()
+
+@pytest.fixture(scope='session')
+def daskClient():
+    """A client of a local cluster with a single worker thread"""
+    distributed = pytest.importorskip('dask.distributed')
+    client = distributed.Client(distributed.LocalCluster(n_workers=1,
+        processes=False, dashboard_address=None))
+    yield client
+    client.close()
+
+@pytest.fixture
+def mockDaskDisplay(daskClient):
+    """Makes PVDisplays of mock PVRenderActors on daskClient's cluster
+
+    mockDaskDisplay(size=(w,h), scene='static', **PVDisplay arguments)
+    """
+    from ipyparaview import PVRenderActor
+    displays = []
+    def make(size=(64,48), scene='static', **kwargs):
+        pvs = MockParaView(size=size, scene=scene)
+        actor = daskClient.submit(PVRenderActor, 0, pvs=pvs,
+                w2i=MockWindowToImage(), actor=True).result()
+        disp = PVDisplay([actor], **kwargs)
+        displays.append(disp)
+        return disp
+    yield make
+    for disp in displays:
+        disp.close()
@@ -0,0 +1,139 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import time
+import numpy as np
+import pytest
+
+from ipyparaview import PVDisplay, PVRenderActor
+from ipyparaview.benchmarks.mock import MockParaView, MockWindowToImage
+from ipyparaview.frames import compressFrame
+from ipyparaview.sharedframes import _attach
+
+from conftest import KEYFRAMES, ROTATE, mockDepth, rotated, unpackDepth, waitFor
+
+def _sent(disp):
+    sent = []
+    disp.send = lambda msg, buffers: sent.append((msg, buffers))
+    return sent
+
+def _render(disp, n=1):
+    for _ in range(n):
+        disp.tp = 0 #past fpsLimit
+        disp.render()
+
+def test_actor_encodes_frames(mockDaskDisplay):
+    disp = mockDaskDisplay(runAsync=False, compressFrames=True)
+    sent = _sent(disp)
+    _render(disp)
+    msg, buffers = sent[-1]
+    assert msg['kind'] == 'compressed' and msg['codec'] == 'jpeg'
+    assert bytes(buffers[0][:2]) == b'\xff\xd8'
+    stages = disp.metrics.percentiles()
+    assert 'actorEncode' in stages and 'actorRender' in stages
+
+@pytest.mark.parametrize('codec', ['png', 'zlib'])
+def test_actor_encodes_lossless_codecs(mockDaskDisplay, codec):
+    disp = mockDaskDisplay(runAsync=False, compressFrames=True, codec=codec)
+    sent = _sent(disp)
+    _render(disp)
+    frame = disp.fetchFrame()
+    msg, buffers = sent[-1]
+    assert msg['codec'] == codec
+    assert bytes(buffers[0]) == compressFrame(frame, codec)
+
+def test_pipelined_actor_frames_published(mockDaskDisplay):
+    disp = mockDaskDisplay(size=(160,100), scene='animated', compressFrames=True,
+            pipelined=True, fpsLimit=1e9)
+    sent = _sent(disp)
+    assert waitFor(lambda: len(sent) >= 20)
+    disp.setAsync(False)
+    stats = disp.pipeline.stats()
+    assert stats['published'] >= 20
+    assert stats['submitted'] - stats['published'] - stats['dropped'] <= disp.pipeline.depth
+
+def test_sequence_defers_interaction(mockDaskDisplay):
+    ref = mockDaskDisplay(runAsync=False)
+    expected = [f.copy() for f in ref.renderSequence(KEYFRAMES, 4, channels=3)]
+    disp = mockDaskDisplay(renderOnDemand=True)
+    cam = disp.master.getCam().result()
+    frames = []
+    for frame in disp.renderSequence(KEYFRAMES, 4, channels=3):
+        disp._handle_custom_msg(ROTATE, [])
+        time.sleep(0.05)
+        frames.append(frame.copy())
+    assert all(np.array_equal(a, b) for a,b in zip(frames, expected))
+    p = rotated(cam, 0.4)
+    assert waitFor(lambda: np.allclose(disp.master.getCam().result()[0], p))
+
+def test_actor_depth_frames(mockDaskDisplay):
+    disp = mockDaskDisplay(size=(64,48), runAsync=False, compressFrames=True,
+            depthFrames=True, depthStep=4)
+    sent = _sent(disp)
+    _render(disp)
+    msg, buffers = sent[-1]
+    assert bytes(buffers[0][:2]) == b'\xff\xd8'
+    assert np.array_equal(unpackDepth(buffers[1]), mockDepth((64,48), 4))
+    assert msg['camera']['position'] == disp.master.getCam().result()[0]
+    assert 'actorDepth' in disp.metrics.percentiles()
+
+def _segmentExists(name):
+    try:
+        _attach(name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+def test_shared_frames(mockDaskDisplay):
+    disp = mockDaskDisplay(size=(64,48), runAsync=False)
+    assert disp.sharedFrames is not None
+    sent = _sent(disp)
+    _render(disp, 3)
+    assert disp.sharedFrames.reads == 3
+    name = disp.sharedFrames.name
+    frame = np.frombuffer(sent[-1][1][0], dtype=np.uint8).reshape(48, 64, 4)
+    assert np.array_equal(frame, disp.fetchFrame())
+    assert _segmentExists(name)
+    disp.close()
+    assert not _segmentExists(name)
+
+class _NoSharedMemoryActor(PVRenderActor):
+    def shareFrames(self):
+        raise OSError('no shared memory')
+
+def test_shared_frames_fallback(daskClient):
+    pvs = MockParaView(size=(64,48), scene='static')
+    actor = daskClient.submit(_NoSharedMemoryActor, 0, pvs=pvs,
+            w2i=MockWindowToImage(), actor=True).result()
+    disp = PVDisplay([actor], runAsync=False)
+    try:
+        assert disp.sharedFrames is None
+        sent = _sent(disp)
+        _render(disp)
+        assert len(sent[-1][1][0]) == 64*48*4
+    finally:
+        disp.close()
+
+def test_actor_fetch_frame_outlives_readback():
+    pvs = MockParaView(size=(64,48), scene='animated')
+    actor = PVRenderActor(0, pvs=pvs, w2i=MockWindowToImage())
+    frames = []
+    for _ in range(6): #more than the actor's ring has slots
+        actor.render()
+        frame = actor.fetchFrame()
+        frames.append((frame, frame.copy()))
+    assert all(np.array_equal(a, b) for a,b in frames)
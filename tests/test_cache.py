@@ -0,0 +1,77 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import pytest
+
+CAMERAS = [[0.0, 0.0, 5.0], [5.0, 0.0, 0.0], [0.0, 0.0, -5.0]]
+FRAME_BYTES = 8 + 8 + 64*48*3 #a frame of the raw codec
+
+def _renderAt(disp, position):
+    disp.renv.CameraPosition = list(position)
+    disp.tp = 0 #past fpsLimit
+    disp.render()
+
+def _cachedDisplay(mockDisplay, cacheBytes=2**20):
+    disp = mockDisplay(size=(64,48), runAsync=False, compressFrames=True,
+            codec='raw', cacheBytes=cacheBytes)
+    disp.send = lambda msg, buffers: None
+    return disp
+
+def test_returning_camera_hits(mockDisplay):
+    disp = _cachedDisplay(mockDisplay)
+    _renderAt(disp, CAMERAS[0])
+    _renderAt(disp, CAMERAS[1])
+    n = disp.renv.renders
+    _renderAt(disp, CAMERAS[0])
+    assert disp.renv.renders == n #no render for a cached frame
+    stats = disp.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+    assert stats['bytes'] == 2*FRAME_BYTES
+
+def test_evicts_least_recently_used(mockDisplay):
+    disp = _cachedDisplay(mockDisplay, cacheBytes=2*FRAME_BYTES)
+    _renderAt(disp, CAMERAS[0])
+    _renderAt(disp, CAMERAS[1])
+    _renderAt(disp, CAMERAS[0]) #now more recent than 1
+    _renderAt(disp, CAMERAS[2]) #evicts 1
+    assert disp.cache.stats()['evictions'] == 1
+    hits = disp.cache.stats()['hits']
+    _renderAt(disp, CAMERAS[0])
+    assert disp.cache.stats()['hits'] == hits + 1
+    n = disp.renv.renders
+    _renderAt(disp, CAMERAS[1])
+    assert disp.renv.renders == n + 1
+    assert disp.cache.stats()['bytes'] <= 2*FRAME_BYTES
+
+def test_scene_change_during_render_not_cached(mockDisplay):
+    disp = _cachedDisplay(mockDisplay)
+    view = disp.renv
+    render = view.render
+    def renderAndModify():
+        render()
+        #a filter changed while the frame was being rendered
+        disp.pvs.servermanager.ProxyManager().SMProxyManager.InvokeEvent(
+                'PropertyModifiedEvent')
+    view.render = renderAndModify
+    _renderAt(disp, CAMERAS[0])
+    view.render = render
+    assert disp.cache.stats()['entries'] == 0
+    assert disp.cache.stats()['invalidations'] == 1
+    n = view.renders
+    _renderAt(disp, CAMERAS[0])
+    assert view.renders == n + 1
+    assert disp.cache.stats()['entries'] == 1
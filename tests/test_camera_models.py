@@ -0,0 +1,33 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import numpy as np
+
+from ipyparaview.camera_models import zoomCameraTurntable, zoomCameraTurntableBatch
+
+CAMERA = ([0.0, 0.5, 3.0], [0.1, 0.0, 0.0], [0.0, 1.0, 0.0])
+
+def test_zoom_matches_batch():
+    for d in (0.5, 1.0, 1.05, 2.0):
+        p,f,u = zoomCameraTurntable(d, *CAMERA, 0.00001)
+        pb,fb,_ = zoomCameraTurntableBatch([d], *CAMERA, 0.00001)
+        assert np.allclose(p, pb[0]) and np.allclose(f, fb[0])
+        assert u == CAMERA[2]
+
+def test_zoom_radius_limit():
+    p,f,_ = zoomCameraTurntable(1e-9, *CAMERA, 0.5)
+    assert np.isclose(np.linalg.norm(p - f), 0.5)
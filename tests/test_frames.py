@@ -0,0 +1,104 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import struct
+import threading
+import numpy as np
+import pytest
+
+from ipyparaview.frames import FrameRing, TileDiffer
+
+def _frame(w, h, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (h,w,3), dtype=np.uint8)
+
+def test_tiles_patch_last_frame():
+    differ = TileDiffer(16)
+    a, b = _frame(100, 50), _frame(100, 50)
+    assert differ.diff(a) == [(0, 0, a)]
+    b[:] = a
+    b[20, 40] = 255 - a[20, 40]
+    tiles = differ.diff(b)
+    assert [(x, y, t.shape) for x,y,t in tiles] == [(32, 16, (16, 16, 3))]
+    assert np.array_equal(differ.last, b)
+    assert differ.diff(b) == []
+
+def test_tile_count_fits_packed_format():
+    #a 4K frame in 8x8 tiles is more tiles than the uint16 count holds
+    differ = TileDiffer(8)
+    differ.diff(np.zeros((2160, 3840, 3), dtype=np.uint8))
+    frame = np.ones((2160, 3840, 3), dtype=np.uint8)
+    tiles = differ.diff(frame)
+    assert len(tiles) == 1
+    packed = TileDiffer.pack(frame, tiles)
+    assert struct.unpack_from('<4H', packed) == (3840, 2160, 3, 1)
+    assert np.array_equal(differ.last, frame)
+
+def test_tile_size_range():
+    with pytest.raises(ValueError):
+        TileDiffer(0)
+
+def test_reset_while_diffing():
+    differ = TileDiffer(4)
+    frames = [_frame(256, 128, i) for i in range(4)]
+    errors = []
+    done = threading.Event()
+    def diff():
+        try:
+            for i in range(200):
+                differ.diff(frames[i % len(frames)])
+        except Exception as e:
+            errors.append(e)
+        done.set()
+    t = threading.Thread(target=diff)
+    t.start()
+    while not done.is_set():
+        differ.reset()
+    t.join()
+    assert errors == []
+
+def test_ring_allocates_once_per_shape(mockDisplay):
+    disp = mockDisplay(size=(64,48), runAsync=False)
+    for _ in range(10):
+        disp.tp = 0 #past fpsLimit
+        disp.render()
+    assert disp.renv.renders == 10
+    assert disp.frames.allocations == disp.frames.slots
+    disp.renv.ViewSize = [32, 24]
+    for _ in range(5):
+        disp.tp = 0
+        disp.render()
+    assert disp.frames.allocations == 2*disp.frames.slots
+
+def test_ring_reuses_buffers():
+    ring = FrameRing(slots=2, channels=4)
+    a, b, c = ring.get(8, 4), ring.get(8, 4), ring.get(8, 4)
+    assert a is c and a is not b
+    assert ring.allocations == 2
+    assert (a[:,:,3] == 255).all()
+    ring.channels = 3
+    assert ring.get(8, 4).shape == (4, 8, 3)
+    assert ring.allocations == 4
+
+def test_fetch_frame_outlives_readback(mockDisplay):
+    disp = mockDisplay(size=(64,48), scene='animated', runAsync=False)
+    frames = []
+    for _ in range(3):
+        disp.tp = 0
+        disp.render()
+        frame = disp.fetchFrame()
+        frames.append((frame, frame.copy()))
+    assert all(np.array_equal(a, b) for a,b in frames)
@@ -0,0 +1,42 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import threading
+import time
+
+from ipyparaview.pipeline import FramePipeline
+
+def test_every_frame_published_or_dropped():
+    published, dropped = [], []
+    lock = threading.Lock()
+    def encode(item):
+        time.sleep(0.005*(item % 3)) #out of order
+        return item
+    def publish(item):
+        with lock:
+            published.append(item)
+    def onDrop(item):
+        with lock:
+            dropped.append(item)
+    pipeline = FramePipeline(encode, publish, depth=2, dropped=onDrop)
+    for i in range(50):
+        pipeline.submit(i)
+        time.sleep(0.001)
+    pipeline.close()
+    assert published == sorted(published)
+    assert sorted(published + dropped) == list(range(50))
+    assert pipeline.stats()['dropped'] == len(dropped) > 0
@@ -0,0 +1,72 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import asyncio
+
+from conftest import ROTATE, waitFor
+
+def _stat(disp, name):
+    #0 until the scheduler has the display
+    stats = disp.schedulingStats()
+    return stats[name] if stats is not None else 0
+
+def test_task_ends_with_last_display(mockDisplay):
+    async def main():
+        a, b = mockDisplay(renderOnDemand=True), mockDisplay(renderOnDemand=True)
+        scheduler = a.scheduler
+        assert b.scheduler is scheduler and scheduler.loop is asyncio.get_running_loop()
+        task = scheduler.task
+        await asyncio.sleep(0.1)
+        a.close()
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        b.close()
+        await asyncio.sleep(0.05)
+        assert task.done() and scheduler.task is None
+    asyncio.run(main())
+
+def test_interactive_frames_ahead_of_others(mockDisplay):
+    a = mockDisplay(fpsLimit=1000.0)
+    a._handle_custom_msg(ROTATE, [])
+    assert waitFor(lambda: _stat(a, 'frames') >= 10)
+    assert _stat(a, 'interactiveFrames') == 0 #nothing to go ahead of
+    b = mockDisplay(fpsLimit=1000.0)
+    assert waitFor(lambda: _stat(b, 'frames') >= 1)
+    n = _stat(a, 'frames')
+    a._handle_custom_msg(ROTATE, [])
+    assert waitFor(lambda: _stat(a, 'frames') >= n + 20)
+    assert _stat(a, 'interactiveFrames') > 0
+    assert _stat(b, 'interactiveFrames') == 0
+
+def test_close_on_loop_during_render(mockDisplay, capfd):
+    #the frame being rendered when the display closes is never published,
+    #nor handed to its closed pipeline
+    async def main():
+        disp = mockDisplay(scene='animated', renderTime=0.05, pipelined=True,
+                compressFrames=True)
+        sent = []
+        disp.send = lambda msg, buffers: sent.append(msg)
+        while not sent:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.02) #partway into a render
+        disp.close()
+        n = len(sent)
+        await asyncio.sleep(0.2)
+        assert len(sent) == n
+        assert disp.pipeline.error is None
+    asyncio.run(main())
+    assert 'Traceback' not in capfd.readouterr().err
@@ -0,0 +1,116 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import asyncio
+import json
+import socket
+import pytest
+from tornado.httpclient import HTTPClientError, HTTPRequest
+from tornado.websocket import websocket_connect
+
+from ipyparaview.stream import FrameServer, _FrameSocket
+
+from conftest import ROTATE
+
+def _freePort():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+def _connect(server, origin='http://localhost:8888'):
+    return websocket_connect(HTTPRequest(server.url, headers={'Origin': origin}))
+
+def test_serves_clients_and_takes_events(mockDisplay):
+    async def main():
+        disp = mockDisplay(renderOnDemand=True)
+        server = FrameServer(disp, port=_freePort())
+        server.start()
+        try:
+            c1, c2 = await _connect(server), await _connect(server)
+            f1, f2 = await c1.read_message(), await c2.read_message()
+            assert f1[:2] == b'\xff\xd8' and f2[:2] == b'\xff\xd8'
+            assert disp.framesSent == 0 #frames bypass the comm
+            p = list(disp.renv.CameraPosition)
+            await c2.write_message(json.dumps(ROTATE))
+            f1 = await asyncio.wait_for(c1.read_message(), 5.0)
+            assert f1[:2] == b'\xff\xd8'
+            assert list(disp.renv.CameraPosition) != p
+            assert server.stats()['clients'] == 2
+        finally:
+            server.stop()
+        assert disp.commFrames
+    asyncio.run(main())
+
+def test_refuses_other_origins(mockDisplay):
+    async def main():
+        disp = mockDisplay(renderOnDemand=True)
+        server = FrameServer(disp, port=_freePort())
+        server.start()
+        try:
+            with pytest.raises(HTTPClientError) as e:
+                await _connect(server, 'http://example.com')
+            assert e.value.code == 403
+            server.origins = ['http://example.com']
+            c = await _connect(server, 'http://example.com')
+            assert (await c.read_message())[:2] == b'\xff\xd8'
+            with pytest.raises(HTTPClientError):
+                await _connect(server)
+        finally:
+            server.stop()
+    asyncio.run(main())
+
+def test_slow_client_gets_latest_frame():
+    async def main():
+        loop = asyncio.get_running_loop()
+        writes = []
+        def write(frame, binary):
+            writes.append((frame, loop.create_future()))
+            return writes[-1][1]
+        client = _FrameSocket.__new__(_FrameSocket)
+        client.sending, client.pending, client.dropped = None, None, 0
+        client.write_message = write
+        for frame in (b'1', b'2', b'3'):
+            client.sendFrame(frame)
+        assert [f for f,_ in writes] == [b'1']
+        writes[0][1].set_result(None)
+        await asyncio.sleep(0)
+        assert [f for f,_ in writes] == [b'1', b'3']
+        assert client.dropped == 1
+        writes[1][1].set_result(None)
+        await asyncio.sleep(0)
+        assert len(writes) == 2
+    asyncio.run(main())
+
+def test_takes_only_interaction(mockDisplay):
+    async def main():
+        disp = mockDisplay(renderOnDemand=True)
+        server = FrameServer(disp, port=_freePort())
+        server.start()
+        try:
+            c = await _connect(server)
+            await c.read_message()
+            disp.window.sent(1)
+            for msg in ({'event': 'frameDrawn', 'n': 1}, {'event': 'rotate'},
+                    {'event': 'visibility', 'view': 'x', 'visible': False}, [1]):
+                await c.write_message(json.dumps(msg))
+            await c.write_message(json.dumps(ROTATE))
+            await asyncio.wait_for(c.read_message(), 5.0)
+            assert disp.window.inFlight() == 1
+            assert disp.visibleViews is None
+        finally:
+            server.stop()
+    asyncio.run(main())
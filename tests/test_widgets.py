@@ -0,0 +1,240 @@
+###############################################################################
+# Copyright (c) 2019, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###############################################################################
+
+
+import random
+import struct
+import time
+import numpy as np
+
+from ipyparaview.frames import TileDiffer
+
+from conftest import KEYFRAMES, ROTATE, mockDepth, rotated, unpackDepth, waitFor
+
+def _proxyModified(disp):
+    disp.pvs.servermanager.ProxyManager().SMProxyManager.InvokeEvent('PropertyModifiedEvent')
+
+def test_render_on_demand_idle(mockDisplay):
+    disp = mockDisplay(renderOnDemand=True)
+    view = disp.renv
+    assert waitFor(lambda: disp.framesSent >= 1)
+    time.sleep(0.1) #a frame being published
+    n = view.renders
+    skipped = disp.schedulingStats()['skippedFrames']
+    time.sleep(0.5)
+    assert view.renders == n
+    #at the default 60 fps limit
+    assert disp.schedulingStats()['skippedFrames'] - skipped >= 20
+
+def test_render_on_demand_rotate(mockDisplay):
+    disp = mockDisplay(renderOnDemand=True)
+    view = disp.renv
+    assert waitFor(lambda: disp.framesSent >= 1)
+    n = view.renders
+    p = list(view.CameraPosition)
+    disp._handle_custom_msg({'event': 'rotate', 'data': {'x': 0.1, 'y': 0.0}}, [])
+    assert waitFor(lambda: view.renders > n)
+    assert list(view.CameraPosition) != p
+
+def test_render_on_demand_property_modified(mockDisplay):
+    disp = mockDisplay(renderOnDemand=True)
+    view = disp.renv
+    assert waitFor(lambda: disp.framesSent >= 1)
+    time.sleep(0.1)
+    n = view.renders
+    _proxyModified(disp)
+    assert waitFor(lambda: view.renders > n)
+    time.sleep(0.3)
+    assert view.renders == n + 1
+    assert disp.skippedFrames > 0
+
+def test_render_on_demand_close(mockDisplay):
+    disp = mockDisplay(renderOnDemand=True)
+    disp.close()
+    n = disp.renv.renders
+    _proxyModified(disp)
+    time.sleep(0.2)
+    assert disp.renv.renders == n
+    assert disp.pipelineObservers == []
+
+def test_dropped_tiles_send_full_frame(mockDisplay):
+    disp = mockDisplay(size=(64,48), deltaFrames=True, tileSize=16,
+            pipelined=True, renderOnDemand=True, frameFormat='rgb')
+    assert waitFor(lambda: disp.framesSent >= 1)
+    sent = []
+    disp.send = lambda msg, buffers: sent.append(buffers[0])
+    disp._handle_custom_msg({'event': 'rotate', 'data': {'x': 0.1, 'y': 0.0}}, [])
+    assert waitFor(lambda: sent)
+    disp.pipeline.onDrop(('tiles', None, False, None, []))
+    assert waitFor(lambda: len(sent) == 2)
+    #a single tile covering the frame
+    assert struct.unpack_from('<8H', sent[1]) == (64, 48, 3, 1, 0, 0, 64, 48)
+
+def test_sequence_defers_interaction(mockDisplay):
+    disp = mockDisplay(renderOnDemand=True)
+    view = disp.renv
+    assert waitFor(lambda: disp.framesSent >= 1)
+    cam = (list(view.CameraPosition), list(view.CameraFocalPoint),
+            list(view.CameraViewUp))
+    frames = disp.renderSequence(KEYFRAMES, 4)
+    next(frames)
+    n = view.renders
+    disp._handle_custom_msg(ROTATE, [])
+    time.sleep(0.2)
+    assert view.renders == n
+    assert len(list(frames)) == 3
+    assert waitFor(lambda: view.renders == n + 4)
+    assert np.allclose(view.CameraPosition, rotated(cam, 0.1))
+
+def test_depth_frames(mockDisplay):
+    disp = mockDisplay(size=(64,48), renderOnDemand=True, depthFrames=True,
+            depthStep=2)
+    assert waitFor(lambda: disp.framesSent >= 1)
+    sent = []
+    disp.send = lambda msg, buffers: sent.append((msg, buffers))
+    disp._handle_custom_msg(dict(ROTATE, t=1234.0), [])
+    assert waitFor(lambda: sent)
+    msg, buffers = sent[0]
+    assert len(buffers) == 2
+    assert np.array_equal(unpackDepth(buffers[1]), mockDepth((64,48), 2))
+    assert msg['camera']['position'] == list(disp.renv.CameraPosition)
+    assert msg['applied'] == 1234.0
+    assert msg['turntable']['rotateScale'] == disp.rotateScale
+
+def _drawTiles(canvas, packed):
+    #what the frontend does with a frame of delta tiles; returns the canvas
+    fw,fh,c,n = struct.unpack_from('<4H', packed)
+    if canvas is None or canvas.shape != (fh, fw, c):
+        canvas = np.zeros((fh, fw, c), dtype=np.uint8)
+    offset = 8 + 8*n
+    for i in range(n):
+        x,y,w,h = struct.unpack_from('<4H', packed, 8 + 8*i)
+        canvas[y:y+h, x:x+w] = np.frombuffer(packed, np.uint8, w*h*c,
+                offset).reshape(h, w, c)
+        offset += w*h*c
+    return canvas
+
+def test_dropped_tiles_keep_canvas_intact(mockDisplay, monkeypatch):
+    #every frame of tiles the frontend gets has to patch its canvas into
+    #the frame they were diffed from, however many the pipeline drops
+    sources = {} #id of the packed tiles: (packed tiles, frame)
+    pack = TileDiffer.pack
+    def recordPack(frame, tiles):
+        packed = pack(frame, tiles)
+        sources[id(packed)] = (packed, frame.copy())
+        return packed
+    monkeypatch.setattr(TileDiffer, 'pack', staticmethod(recordPack))
+
+    disp = mockDisplay(size=(64,48), scene='partial', deltaFrames=True,
+            tileSize=8, pipelined=True, frameFormat='rgb', fpsLimit=500.0,
+            renderOnDemand=True)
+    encode = disp.pipeline.encode
+    rng = random.Random(0)
+    def slowEncode(job):
+        time.sleep(rng.choice([0.0, 0.0, 0.0, 0.005]))
+        return encode(job)
+    disp.pipeline.encode = slowEncode
+
+    mismatches = []
+    canvas = [None]
+    def send(msg, buffers):
+        packed, frame = sources[id(buffers[0])]
+        canvas[0] = _drawTiles(canvas[0], packed)
+        if not np.array_equal(canvas[0], frame):
+            mismatches.append(msg['n'])
+    disp.send = send
+    disp.tiles.reset() #a new frontend, starting from a full frame
+    disp.renderOnDemand = False
+    disp.markDirty()
+    assert waitFor(lambda: disp.pipeline.stats()['dropped'] >= 20 and
+            disp.framesSent >= 50)
+    disp.setAsync(False)
+    disp.pipeline.close()
+    assert disp.framesSent > 0
+    assert mismatches == []
+
+def _renderNow(disp):
+    disp.tp = 0 #past fpsLimit
+    disp.render()
+
+def _windowedDisplay(mockDisplay, **kwargs):
+    #a display rendering on render() whose frontend acked its first frame
+    disp = mockDisplay(size=(64,48), scene='animated', runAsync=False,
+            maxFramesInFlight=2, **kwargs)
+    sent = []
+    disp.send = lambda msg, buffers: sent.append((msg, buffers[0]))
+    _renderNow(disp)
+    disp._handle_custom_msg({'event': 'frameDrawn', 'n': 1}, [])
+    return disp, sent
+
+def _ack(disp, sent):
+    disp._handle_custom_msg({'event': 'frameDrawn', 'n': sent[-1][0]['n']}, [])
+
+def test_window_holds_newest_frame(mockDisplay):
+    disp, sent = _windowedDisplay(mockDisplay)
+    for i in range(5):
+        _renderNow(disp)
+    assert disp.framesSent == 1 + disp.maxFramesInFlight
+    assert disp.framesReplaced == 2
+    newest = disp.fetchFrame().tobytes()
+    _ack(disp, sent)
+    assert disp.framesSent == 2 + disp.maxFramesInFlight
+    assert sent[-1][1] == newest
+    _ack(disp, sent) #nothing held any more
+    assert disp.framesSent == 2 + disp.maxFramesInFlight
+
+def test_window_replaced_tiles_send_full_frame(mockDisplay):
+    disp, sent = _windowedDisplay(mockDisplay, deltaFrames=True, tileSize=16,
+            frameFormat='rgb')
+    for i in range(2):
+        _renderNow(disp)
+    assert disp.framesSent == 1 + disp.maxFramesInFlight
+    generation = disp.tiles.generation
+    _renderNow(disp) #held
+    _renderNow(disp) #tiles of a held frame can't replace it
+    assert disp.tiles.generation == generation + 1
+    assert disp.heldFrame is None
+    _renderNow(disp)
+    _ack(disp, sent)
+    assert disp.framesSent == 2 + disp.maxFramesInFlight
+    #a single tile covering the frame
+    assert struct.unpack_from('<8H', sent[-1][1]) == (64, 48, 3, 1, 0, 0, 64, 48)
+
+def test_window_recovers_from_lost_acks(mockDisplay):
+    disp = mockDisplay(size=(64,48), scene='animated', maxFramesInFlight=2)
+    assert waitFor(lambda: disp.framesSent >= 1)
+    disp.window.timeout = 0.2
+    disp._handle_custom_msg({'event': 'frameDrawn', 'n': disp.framesSent}, [])
+    n = disp.framesSent
+    time.sleep(0.1)
+    assert disp.framesSent <= n + disp.maxFramesInFlight
+    #the frontend never acks again; its frames time out of the window
+    assert waitFor(lambda: disp.framesSent > n + disp.maxFramesInFlight)
+
+def test_decode_error_frees_window_for_full_frame(mockDisplay):
+    disp, sent = _windowedDisplay(mockDisplay, deltaFrames=True, tileSize=16,
+            frameFormat='rgb')
+    for i in range(3):
+        _renderNow(disp)
+    assert disp.framesSent == 1 + disp.maxFramesInFlight
+    n = disp.framesSent
+    disp._handle_custom_msg({'event': 'decodeError', 'n': n}, [])
+    assert disp.framesSent == n #the held tiles went with the failed frame
+    _renderNow(disp)
+    assert disp.framesSent == n + 1
+    assert disp.window.inFlight() == 1
+    #a single tile covering the frame
+    assert struct.unpack_from('<8H', sent[-1][1]) == (64, 48, 3, 1, 0, 0, 64, 48)